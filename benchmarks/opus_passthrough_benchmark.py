@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Measures ffmpeg CPU time per stream for the two playback paths:
+
+  pcm          decode to 48 kHz s16le (FFmpegPCMAudio) and re-encode to Opus,
+               standing in for discord's libopus encoder
+  passthrough  remux the Opus packets with -c:a copy (FFmpegOpusAudio, codec="copy")
+
+A test .opus file is generated with ffmpeg unless one is passed in. Python-side
+work (PCMVolumeTransformer's per-frame multiply) only adds to the pcm figure.
+
+Usage: python benchmarks/opus_passthrough_benchmark.py [file.opus] [seconds]
+(seconds is the length of the generated file, or of the file passed in)
+"""
+import os
+import sys
+import resource
+import subprocess
+import tempfile
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def make_test_file(path, seconds):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-ac", "2", "-ar", "48000", "-c:a", "libopus", "-b:a", "128k", path],
+        check=True
+    )
+
+def run_pcm(path):
+    decode = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "s16le", "-ar", "48000", "-ac", "2", "pipe:1"],
+        stdout=subprocess.PIPE
+    )
+    encode = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-f", "s16le", "-ar", "48000", "-ac", "2", "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", "128k", "-f", "opus", "pipe:1"],
+        stdin=decode.stdout, stdout=subprocess.DEVNULL
+    )
+    decode.stdout.close()
+    encode.wait()
+    decode.wait()
+
+def run_passthrough(path):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-map_metadata", "-1", "-f", "opus", "-c:a", "copy", "pipe:1"],
+        stdout=subprocess.DEVNULL, check=True
+    )
+
+def measure(label, func, path, seconds):
+    before = child_cpu()
+    func(path)
+    cpu = child_cpu() - before
+    per_minute = cpu / (seconds / 60)
+    print(f"{label:<12} {cpu:.3f}s CPU for {seconds}s of audio -> {per_minute:.3f}s CPU per stream-minute")
+    return per_minute
+
+def main():
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    with tempfile.TemporaryDirectory() as tmp:
+        path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tmp, "test.opus")
+        if not os.path.exists(path):
+            make_test_file(path, seconds)
+
+        pcm = measure("pcm", run_pcm, path, seconds)
+        passthrough = measure("passthrough", run_passthrough, path, seconds)
+        print(f"ratio        {pcm / max(passthrough, 1e-6):,.1f}x less CPU per stream with passthrough")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Measures prefix lookups per second (the work get_prefix does for every message)
+with the old read-and-parse-per-call JSON path and with the cached StateStore.
+
+Usage: python benchmarks/state_store_benchmark.py [guilds] [messages]
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.state_store import StateStore
+
+def build_config(path, guilds):
+    config = {
+        str(gid): {"prefix": random.choice("!?.$"), "dj_role": None, "channel": None, "autoplay": False}
+        for gid in range(guilds)
+    }
+    with open(path, "w") as f:
+        json.dump(config, f, indent=4)
+
+def uncached_lookup(path, guild_id):
+    with open(path, "r") as f:
+        config = json.load(f)
+    return config.get(str(guild_id), {"prefix": "!"}).get("prefix", "!")
+
+def run(label, lookup, guild_ids):
+    start = time.perf_counter()
+    for gid in guild_ids:
+        lookup(gid)
+    elapsed = time.perf_counter() - start
+    rate = len(guild_ids) / elapsed
+    print(f"{label:<10} {len(guild_ids)} messages in {elapsed:.3f}s -> {rate:,.0f} msg/s")
+    return rate
+
+def main():
+    guilds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    guild_ids = [random.randrange(guilds) for _ in range(messages)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "server_config.json")
+        build_config(path, guilds)
+        print(f"Config with {guilds} guilds ({os.path.getsize(path)} bytes)")
+
+        before = run("before", lambda gid: uncached_lookup(path, gid), guild_ids)
+        store = StateStore(os.path.join(tmp, "state.db"))
+        store.migrate_json_files({"server_config": path})
+        after = run("after", lambda gid: store.get_guild_config(gid).get("prefix", "!"), guild_ids)
+        store.close()
+        print(f"speedup    {after / before:,.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Measures the setup cost yt-dlp adds to every search and download: building a
+fresh YoutubeDL per call (the old path) against borrowing a warm one from
+YoutubeDLPool, for the search and download profiles.
+
+With --network it also times a real search end to end both ways, which shows
+how much of a search's latency the setup accounted for.
+
+Usage: python benchmarks/ytdl_pool_benchmark.py [iterations] [--network] [query]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+
+from utils.ytdl_pool import PROFILES, YoutubeDLPool
+
+def timed(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+def fresh(profile, action=None):
+    def run():
+        with yt_dlp.YoutubeDL(dict(PROFILES[profile])) as ydl:
+            if action:
+                action(ydl)
+    return run
+
+def pooled(pool, profile, action=None):
+    def run():
+        with pool.borrow(profile) as ydl:
+            if action:
+                action(ydl)
+    return run
+
+def report(label, fresh_ms, pooled_ms):
+    print(f"{label:<28} fresh {fresh_ms[0]:8.2f} ms (max {fresh_ms[1]:8.2f})   "
+          f"pooled {pooled_ms[0]:8.2f} ms (max {pooled_ms[1]:8.2f})   {fresh_ms[0] / max(pooled_ms[0], 1e-6):,.0f}x")
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--network"]
+    network = "--network" in sys.argv
+    iterations = int(args[0]) if args else 50
+    query = args[1] if len(args) > 1 else "never gonna give you up"
+
+    # The search profile reads Chrome cookies, which this machine may not have.
+    profiles = {name: opts for name, opts in PROFILES.items() if "cookiesfrombrowser" not in opts}
+    pool = YoutubeDLPool(profiles)
+    for profile in ("search-fallback", "search-list", "opus-download", "mp3-download"):
+        pool.warm(profile)
+        report(f"setup: {profile}", timed(fresh(profile), iterations), timed(pooled(pool, profile), iterations))
+
+    if network:
+        search = lambda ydl: ydl.extract_info(query, download=False)
+        runs = max(3, iterations // 10)
+        report("search end to end", timed(fresh("search-fallback", search), runs), timed(pooled(pool, "search-fallback", search), runs))
+
+    print(f"pool: {pool.stats()}")
+    pool.close()
+
+if __name__ == "__main__":
+    main()
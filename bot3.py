@@ -3,10 +3,8 @@ import os
 import re
 import sys
 import json
-import random
 import tempfile
 import requests
-import yt_dlp
 import asyncio
 import aiohttp
 import musicbrainzngs
@@ -15,20 +13,44 @@ import subprocess
 import time
 import platform
 import resource
+import math
 import logging
 import ffmpeg
 import psutil
+import atexit
+import signal
+import threading
 
 from utils.voice_utils import start_listening, stop_listening
 from utils.youtube_pl import grab_youtube_pl
 from utils.lyrics import Lyrics
 from utils.albumart import AlbumArtFetcher
 from utils.metadata import MetadataManager
-
-
-from sources.youtube_mp3 import get_audio_filename
-from sources.bandcamp_mp3 import get_bandcamp_audio, get_bandcamp_title
-from sources.soundcloud_mp3 import get_soundcloud_audio, get_soundcloud_title
+from utils.state_store import StateStore
+from utils.persistence import WriteBehind
+from utils.queue_journal import QueueJournal
+from utils.guild_queue import GuildQueue
+from utils.download_scheduler import DownloadScheduler, PLAYBACK, PRELOAD, BULK
+from utils.audio_cache import AudioCacheManager
+from utils.audio_index import AudioIndex
+from utils.single_flight import SingleFlight
+from utils.progressive import GrowingFileReader, wait_for_bytes
+from utils.session_snapshot import SessionSnapshot
+from utils.blacklist import BlacklistMatcher, normalize_title
+from utils.common import atomic_write_json, canonical_page_url
+
+
+from sources.youtube_mp3 import get_audio_filename, YouTubeAudioStreamer
+from utils.stream_resolver import StreamResolver
+from utils.ytdl_pool import ytdl_pool, track_file_path
+from utils.ytdl_backend import ytdl_backend, PermanentDownloadError
+from utils.preloader import Preloader
+from utils.loudness import LoudnessAnalyzer, normalization_gain
+from utils.duration import DurationService
+from utils.seek_index import SeekIndexStore
+from utils.download_manager import DownloadManager, staged_path, commit_download
+from sources.bandcamp_mp3 import BandcampAudioStreamer, get_bandcamp_audio, get_bandcamp_title, get_bandcamp_tracklist
+from sources.soundcloud_mp3 import SoundCloudAudioStreamer, get_soundcloud_audio, get_soundcloud_title, get_soundcloud_tracklist
 from sources.spotify_mp3 import spotify_to_youtube, get_spotify_tracks_from_playlist, get_spotify_title
 from sources.apple_music_mp3 import get_apple_music_audio
 
@@ -38,7 +60,7 @@ from io import BytesIO
 from aiofiles import open as aopen
 from discord.ext import commands
 from discord.ui import View, Button
-from discord import FFmpegPCMAudio, Embed
+from discord import FFmpegPCMAudio, FFmpegOpusAudio, PCMVolumeTransformer, Embed
 from discord.errors import ClientException
 from fuzzywuzzy import fuzz
 
@@ -52,29 +74,58 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "your_default_token")
 QUEUE_PAGE_SIZE = int(os.getenv("QUEUE_PAGE_SIZE","10"))
 HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE","10"))
 TIMEOUT_TIME = int(os.getenv("TIMEOUT_TIME", "60"))
+CONFIG_CHECK_INTERVAL = float(os.getenv("CONFIG_CHECK_INTERVAL", "1.0"))
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "2.0"))
+QUEUE_JOURNAL_COMPACT_EVERY = int(os.getenv("QUEUE_JOURNAL_COMPACT_EVERY", "500"))
+VOICE_RESUME_CONCURRENCY = int(os.getenv("VOICE_RESUME_CONCURRENCY", "5"))
+SESSION_SNAPSHOT_MAX_AGE = int(os.getenv("SESSION_SNAPSHOT_MAX_AGE", "600"))
+TITLE_FETCH_CONCURRENCY = int(os.getenv("TITLE_FETCH_CONCURRENCY", "4"))
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
+MAX_GUILD_DOWNLOADS = int(os.getenv("MAX_GUILD_DOWNLOADS", "2"))
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "10240"))
+OPUS_PASSTHROUGH = os.getenv("OPUS_PASSTHROUGH", "1") == "1"
+LOUDNESS_NORMALIZATION = os.getenv("LOUDNESS_NORMALIZATION", "0") == "1"
+LOUDNESS_TARGET = float(os.getenv("LOUDNESS_TARGET", "-14"))
+LOUDNESS_TOLERANCE_DB = float(os.getenv("LOUDNESS_TOLERANCE_DB", "1.0"))
+SEEK_INDEX_INTERVAL = float(os.getenv("SEEK_INDEX_INTERVAL", "1.0"))
+PARTIAL_DOWNLOAD_MAX_AGE_HOURS = float(os.getenv("PARTIAL_DOWNLOAD_MAX_AGE_HOURS", "24"))
+VERIFY_CACHE_CHECKSUMS = os.getenv("VERIFY_CACHE_CHECKSUMS", "0") == "1"
+PROGRESSIVE_PLAYBACK = os.getenv("PROGRESSIVE_PLAYBACK", "1") == "1"
+PROGRESSIVE_START_KB = int(os.getenv("PROGRESSIVE_START_KB", "256"))
+STREAM_MODE = os.getenv("STREAM_MODE", "cache").lower()
+STREAM_CACHE_AFTER_PLAYS = int(os.getenv("STREAM_CACHE_AFTER_PLAYS", "3"))
+YTDL_PROCESS_WORKERS = int(os.getenv("YTDL_PROCESS_WORKERS", "0"))
+PRELOAD_WINDOW = int(os.getenv("PRELOAD_WINDOW", "3"))
 
 #CONFIGS
 LOG_FILE = "config/debug.log"
 CONFIG_FILE = "config/server_config.json"
 VOLUME_CONFIG_PATH = "config/volume.json"
 QUEUE_BACKUP_DIR = "config/queuebackup/"
+QUEUE_JOURNAL_DIR = "config/queuejournal/"
+SESSION_SNAPSHOT_PATH = "config/session_snapshot.json"
 BANNED_USERS_PATH = "config/banned.json"
 COMMANDS_FILE_PATH = "config/commands.txt"
 STATS_CONFIG_PATH = "config/stats_config.json"
 BLACKLIST_PATH = "config/blackwhitelist.json"
 DEBUG_CONFIG_PATH = "config/debug_mode.json"
+EDITORS_CONFIG_PATH = "config/metadataeditors.json"
+STATE_DB_PATH = "config/state.db"
+AUDIO_INDEX_PATH = "config/audio_index.db"
+PROGRESSIVE_DIR = "music/.progressive"
+SEEK_INDEX_DIR = "music/.seekindex"
+STREAM_MODES = ("cache", "stream", "auto")
+STREAM_RECONNECT_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
 cookies_file_path = "config/cookies.txt"
 
 #INITIALIZATION
 musicbrainzngs.set_useragent(MUSICBRAINZ_USERAGENT, MUSICBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
 executor = ThreadPoolExecutor(max_workers=EXECUTOR_MAX_WORKERS)
+ytdl_backend.configure(executor, YTDL_PROCESS_WORKERS)
 logging.basicConfig(filename=LOG_FILE, level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 
 os.makedirs(QUEUE_BACKUP_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-if not os.path.exists(CONFIG_FILE):
-    with open(CONFIG_FILE, "w") as f:
-        f.write("{}")
+os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
 
 if not os.path.exists(cookies_file_path):
     with open(cookies_file_path, "w") as f:
@@ -88,31 +139,26 @@ def is_owner_or_server_owner(ctx):
         
     return False
 
-if not os.path.exists(CONFIG_FILE):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump({}, f)
-
-def load_config():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+state_store = StateStore(STATE_DB_PATH, check_interval=CONFIG_CHECK_INTERVAL)
+state_store.migrate_json_files({
+    "server_config": CONFIG_FILE,
+    "volume": VOLUME_CONFIG_PATH,
+    "banned": BANNED_USERS_PATH,
+    "stats": STATS_CONFIG_PATH,
+    "blackwhitelist": BLACKLIST_PATH,
+    "debug": DEBUG_CONFIG_PATH,
+    "editors": EDITORS_CONFIG_PATH,
+})
 
-def save_config(config):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=4)
+persistence = WriteBehind(executor, interval=WRITE_BEHIND_INTERVAL, batch=state_store.transaction)
+atexit.register(persistence.flush_sync)
 
 def get_server_config(guild_id):
-    config = load_config()
-    return config.get(str(guild_id), {"prefix": "!", "dj_role": None, "channel": None, "autoplay": False})
+    return state_store.get_guild_config(guild_id)
 
 def update_server_config(guild_id, key, value):
-    config = load_config()
-    if str(guild_id) not in config:
-        config[str(guild_id)] = {"prefix": "!", "dj_role": None, "channel": None, "autoplay": False}
-    config[str(guild_id)][key] = value
-    save_config(config)
+    state_store.stage_guild_config(guild_id, key, value)
+    persistence.schedule(("guild_config", guild_id, key), state_store.update_guild_config, guild_id, key, value, False)
 
 async def get_prefix(bot, message):
     if message.guild:
@@ -120,95 +166,30 @@ async def get_prefix(bot, message):
         return config.get("prefix", "!")
     return "!"
 
-def load_volume_settings():
-    if os.path.exists(VOLUME_CONFIG_PATH):
-        try:
-            with open(VOLUME_CONFIG_PATH, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-def save_volume_settings(volume_data):
-    with open(VOLUME_CONFIG_PATH, "w") as f:
-        json.dump(volume_data, f, indent=4)
-
 def get_backup_path(guild_id=None):
     if guild_id:
         return os.path.join(QUEUE_BACKUP_DIR, f"{guild_id}.json")
     return os.path.join(QUEUE_BACKUP_DIR, "global_backup.json")
 
-def save_queue_backup(guild_id=None):
-    try:
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
-    except Exception as e:
-        logging.error("No Queues initalized. Failed to save queue backup.")
-
+async def save_queue_backup(guild_id=None):
     backup_path = get_backup_path(guild_id)
     backup_data = {}
     
     if guild_id:
-        backup_data[guild_id] = list(server_queues.get(guild_id, asyncio.Queue())._queue)
+        backup_data[guild_id] = get_guild_queue(guild_id).snapshot()
     else:
         for gid, queue in server_queues.items():
-            backup_data[gid] = list(queue._queue)
-    
-    with open(backup_path, "w") as f:
-        json.dump(backup_data, f, indent=4)
+            backup_data[gid] = queue.snapshot()
 
-def load_queue_backup(guild_id=None):
-    try:
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
-    except Exception as e:
-        logging.error("No Queues initalized. Failed to load queue backup.")
+    await run_blocking_in_executor(atomic_write_json, backup_path, backup_data)
 
+def load_queue_backup(guild_id=None):
     backup_path = get_backup_path(guild_id)
     if os.path.exists(backup_path):
         with open(backup_path, "r") as f:
             return json.load(f)
     return {}
 
-def load_banned_users():
-    if os.path.exists(BANNED_USERS_PATH):
-        with open(BANNED_USERS_PATH, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_banned_users(banned_data):
-    with open(BANNED_USERS_PATH, "w") as f:
-        json.dump(banned_data, f, indent=4)
-
-def load_stats_config():
-    if os.path.exists(STATS_CONFIG_PATH):
-        with open(STATS_CONFIG_PATH, "r") as f:
-            return json.load(f)
-    return {"show_stats": True}
-
-def save_stats_config(config_data):
-    with open(STATS_CONFIG_PATH, "w") as f:
-        json.dump(config_data, f, indent=4)
-
-def load_blacklist():
-    if os.path.exists(BLACKLIST_PATH):
-        with open(BLACKLIST_PATH, "r") as f:
-            return json.load(f)
-    return {"blacklist": [], "whitelist": []}
-
-def save_blacklist(data):
-    with open(BLACKLIST_PATH, "w") as f:
-        json.dump(data, f, indent=4)
-
-def load_debug_mode():
-    if os.path.exists(DEBUG_CONFIG_PATH):
-        with open(DEBUG_CONFIG_PATH, "r") as f:
-            return json.load(f)
-    return {"debug": False}
-
-def save_debug_mode(config_data):
-    with open(DEBUG_CONFIG_PATH, "w") as f:
-        json.dump(config_data, f, indent=4)
-
 intents = discord.Intents.default()
 intents.messages = True
 intents.message_content = True
@@ -223,6 +204,8 @@ os.makedirs('static', exist_ok=True)
 
 bot.intentional_disconnections = {}
 bot.timeout_tasks = {}
+bot.cache_verified = False
+bot.shutting_down = False
 server_queues = {}
 current_tracks = {}
 queue_paused = {}
@@ -233,15 +216,134 @@ last_active_channels = {}
 now_playing = {}
 reconnect_cooldowns = {}
 FAILED_CONNECTS = {}
-preload_tasks = {}
 reconnect_cooldowns = {}
+queue_locks = {}
+title_fill_tasks = set()
+download_scheduler = DownloadScheduler(MAX_CONCURRENT_DOWNLOADS, MAX_GUILD_DOWNLOADS)
+download_flights = SingleFlight()
+# Queued album/set tracks (by the path they are queued under) that still need downloading: path -> (source, page URL).
+# The queue items carry the page URL as a third element, so the map can be rebuilt from the queue journal.
+pending_imports = {}
+
+def restore_pending_imports(items):
+    """Re-registers the downloads of restored album/set tracks whose file is still missing."""
+    for item in items:
+        if item[0][:1] == "|" and len(item) > 2 and not os.path.exists(item[0][1:]):
+            path = item[0][1:]
+            pending_imports[path] = (os.path.basename(path).split("-", 1)[0], item[2])
+
+def drop_pending_imports():
+    """Cancels the album/set downloads of tracks no longer queued in any guild and forgets them."""
+    for path in list(pending_imports):
+        track_id = f"|{path}"
+        if any(track_id in queue for queue in server_queues.values()):
+            continue
+        # A download that playback is waiting on is left to finish.
+        if download_flights.cancel(("import", path)) or ("import", path) not in download_flights:
+            pending_imports.pop(path, None)
+
+def pinned_audio_keys():
+    """Track ids and file paths the cache must keep: queued, preloading or playing in any guild. Event loop only."""
+    keys = {key[1] for key in download_flights.keys()}
+    for queue in server_queues.values():
+        keys.update(track_id.lstrip("|") for track_id in queue.track_ids())
+    for track_state in current_tracks.values():
+        keys.add(track_state.get("audio_file"))
+        current = track_state.get("current_track")
+        if current:
+            keys.add(current[0].lstrip("|"))
+    return keys
+
+audio_index = AudioIndex(AUDIO_INDEX_PATH, "music")
+atexit.register(audio_index.close)
+download_manager = DownloadManager(audio_index, "music", progressive_dir=PROGRESSIVE_DIR, partial_max_age=PARTIAL_DOWNLOAD_MAX_AGE_HOURS * 3600)
+download_manager.sweep()
+loudness_analyzer = LoudnessAnalyzer(audio_index, executor)
+duration_service = DurationService(audio_index)
+seek_indexes = SeekIndexStore(SEEK_INDEX_DIR, executor, interval=SEEK_INDEX_INTERVAL)
+
+def analyze_audio(path):
+    """Queues the background work for a downloaded (or played) file: loudness measurement and seek index."""
+    loudness_analyzer.request(path)
+    seek_indexes.request(path)
+
+def forget_audio_file(path):
+    audio_index.remove_path(path)
+    seek_indexes.remove(path)
+
+def audio_last_played():
+    """Absolute path -> last play (or download) time, from the audio index; thread-safe."""
+    return {os.path.abspath(entry["path"]): entry["last_played"] or entry["created"] for entry in audio_index.entries()}
+
+audio_cache = AudioCacheManager("music", AUDIO_CACHE_MAX_MB * 1024 * 1024, pinned=pinned_audio_keys, last_played=audio_last_played, executor=executor, on_evict=forget_audio_file)
+stream_resolver = StreamResolver()
+title_fetch_semaphore = asyncio.Semaphore(TITLE_FETCH_CONCURRENCY)
+PENDING_TITLE = "(fetching title...)"
+
+queue_journal = QueueJournal(QUEUE_JOURNAL_DIR, compact_every=QUEUE_JOURNAL_COMPACT_EVERY)
+atexit.register(queue_journal.close)
+session_snapshot = SessionSnapshot(SESSION_SNAPSHOT_PATH, max_age=SESSION_SNAPSHOT_MAX_AGE)
+
+def compact_queue_journal(guild_id, queue):
+    """Snapshots the guild's queue on the loop and writes it (with its fsync) in the executor."""
+    write = queue_journal.start_compaction(guild_id, queue.snapshot() if queue else [])
+    if write is None:
+        return
+
+    def finished(task):
+        failed = task.cancelled() or task.exception() is not None
+        if failed and not task.cancelled():
+            logging.error(f"Failed to compact the queue journal for guild {guild_id}", exc_info=task.exception())
+        queue_journal.finish_compaction(guild_id, not failed)
 
-guild_volumes = load_volume_settings()
-banned_users = load_banned_users()
-stats_config = load_stats_config()
-blacklist_data = load_blacklist()
-debug_config = load_debug_mode()
-metadata_manager = MetadataManager("./metacache","./config/metadataeditors.json",MUSICBRAINZ_USERAGENT, MUSICBRAINZ_VERSION, MUSICBRAINZ_CONTACT)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Not running on the loop (startup); write it here.
+        written = False
+        try:
+            write()
+            written = True
+        finally:
+            queue_journal.finish_compaction(guild_id, written)
+        return
+    loop.run_in_executor(executor, write).add_done_callback(finished)
+
+def journal_queue(guild_id, op, *args):
+    """GuildQueue journal hook; compacts the guild's journal when due or when its queue is empty, and re-plans preloads."""
+    try:
+        queue = server_queues.get(guild_id)
+        if queue_journal.record(guild_id, op, *args) or not queue:
+            compact_queue_journal(guild_id, queue)
+    except Exception:
+        logging.exception(f"Failed to journal queue '{op}' for guild {guild_id}")
+    if op in ("r", "c") and pending_imports:
+        drop_pending_imports()
+    # Edits while playing move the look-ahead window; "g" is play_next taking
+    # the next track, which re-plans once that track has started.
+    if op != "g" and preloader.is_active(guild_id):
+        plan_preloads(guild_id)
+
+def get_guild_queue(guild_id):
+    """Returns the guild's GuildQueue, creating an empty one on first use."""
+    queue = server_queues.get(guild_id)
+    if queue is None:
+        queue = server_queues[guild_id] = GuildQueue(guild_id, journal=journal_queue)
+    return queue
+
+for restored_guild_id, restored_items in queue_journal.restore().items():
+    server_queues[restored_guild_id] = GuildQueue(restored_guild_id, restored_items, journal=journal_queue)
+    restore_pending_imports(restored_items)
+    logging.info(f"Restored {len(restored_items)} queued tracks for guild {restored_guild_id} from the queue journal.")
+
+guild_volumes = state_store.get_volumes()
+banned_users = state_store.get_banned_users()
+stats_config = {"show_stats": state_store.get_setting("show_stats", True)}
+blacklist_data = state_store.get_title_filters()
+debug_config = {"debug": state_store.get_setting("debug", False)}
+# Play counts for the "auto" stream mode, kept in memory so preload planning never queries SQLite.
+play_counts = state_store.get_play_counts()
+metadata_manager = MetadataManager("./metacache",EDITORS_CONFIG_PATH,MUSICBRAINZ_USERAGENT, MUSICBRAINZ_VERSION, MUSICBRAINZ_CONTACT, state_store=state_store)
 
 @bot.event
 async def on_message(message):
@@ -249,34 +351,254 @@ async def on_message(message):
         last_active_channels[message.guild.id] = message.channel.id
     await bot.process_commands(message)
 
-async def download_audio(video_id):
+async def download_audio(video_id, guild_id=None, priority=PRELOAD, fallback=False):
+    cached_path = audio_index.path_for("youtube", video_id)
+    if cached_path:
+        return cached_path
+    # Joining a preload that is still queued: it now runs at this caller's priority.
+    download_scheduler.escalate(("youtube", video_id), priority)
+    return await download_flights.do(("youtube", video_id), fetch_youtube_audio, video_id, guild_id, priority, fallback)
+
+async def fetch_youtube_audio(video_id, guild_id, priority, fallback=False):
     try:
-        if asyncio.iscoroutinefunction(get_audio_filename):
-            filenam = await get_audio_filename(video_id)
-        else:
-            loop = asyncio.get_running_loop()
-            filenam = await loop.run_in_executor(executor, get_audio_filename, video_id)
+        async with download_scheduler.slot(guild_id, priority, ("youtube", video_id)):
+            if asyncio.iscoroutinefunction(get_audio_filename):
+                filenam = await get_audio_filename(video_id, audio_index, fallback)
+            else:
+                loop = asyncio.get_running_loop()
+                filenam = await loop.run_in_executor(executor, get_audio_filename, video_id, audio_index, fallback)
 
         if not filenam or not os.path.exists(filenam):
             raise ValueError(f"Downloaded file is missing or invalid for {video_id}")
         
         logging.info(f"{filenam} is ready...")
+        analyze_audio(filenam)
+        audio_cache.request_sweep()
         return filenam
     except Exception as e:
         logging.error(f"Failed to download audio for {video_id}: {e}")
         raise
 
 
-async def retry_download(video_id, retries=2):
+async def retry_download(video_id, retries=2, guild_id=None, priority=PLAYBACK):
+    """Downloads with at most retries extractions in total; retries ask youtube.com instead of music.youtube.com."""
     for attempt in range(retries):
         try:
-            return await download_audio(video_id)
+            return await download_audio(video_id, guild_id, priority, fallback=attempt > 0)
+        except PermanentDownloadError as e:
+            logging.error(f"[{video_id}] Not retrying, the video cannot be downloaded: {e}")
+            return None
         except Exception as e:
             logging.warning(f"[{video_id}] Retry {attempt+1} failed: {e}")
             await asyncio.sleep(1)
     logging.error(f"[{video_id}] All retries failed.")
     return None
 
+async def open_progressive_stream(video_id, guild_id):
+    """
+    Starts a download that can be played while it is still being written.
+    Returns (partial_path, reader) once PROGRESSIVE_START_KB are on disk, or
+    None when the track should take the normal download path (already cached,
+    already downloading, finished too fast to bother, or failed). Raises
+    PermanentDownloadError if the video cannot be downloaded at all.
+    """
+    if not PROGRESSIVE_PLAYBACK or ("youtube", video_id) in download_flights or audio_index.path_for("youtube", video_id):
+        return None
+    try:
+        streamer = YouTubeAudioStreamer(video_id, audio_index)
+    except ValueError:
+        return None
+    os.makedirs(PROGRESSIVE_DIR, exist_ok=True)
+    partial_path = os.path.join(PROGRESSIVE_DIR, f"{video_id}.stream")
+    finished = threading.Event()
+    task = download_flights.start(("youtube", video_id), fetch_progressive_audio, streamer, partial_path, finished, guild_id)
+    if not await wait_for_bytes(partial_path, PROGRESSIVE_START_KB * 1024, task):
+        if not task.cancelled() and isinstance(task.exception(), PermanentDownloadError):
+            raise task.exception()
+        return None
+    return partial_path, GrowingFileReader(partial_path, finished)
+
+async def fetch_progressive_audio(streamer, partial_path, finished, guild_id):
+    async with download_scheduler.slot(guild_id, PLAYBACK):
+        audio_file = await streamer.download_progressive(partial_path, finished)
+    # Point anything still playing from the partial file at the cached copy (for !seek / !volume).
+    for track_state in list(current_tracks.values()):
+        if track_state.get("audio_file") == partial_path:
+            track_state["audio_file"] = audio_file
+    analyze_audio(audio_file)
+    audio_cache.request_sweep()
+    return audio_file
+
+def is_remote_source(audio_file):
+    return isinstance(audio_file, str) and audio_file.startswith(("http://", "https://"))
+
+def should_stream(video_id, guild_id):
+    """
+    Stream-or-cache policy for a track that is not cached yet. "stream" always
+    plays straight from the source URL, "cache" always downloads, and "auto"
+    streams a track until it has been played STREAM_CACHE_AFTER_PLAYS times,
+    then downloads it. A guild's !streammode overrides STREAM_MODE.
+    """
+    mode = get_server_config(guild_id).get("stream_mode") or STREAM_MODE
+    if mode == "stream":
+        return True
+    if mode == "auto":
+        return play_counts.get(video_id, 0) < STREAM_CACHE_AFTER_PLAYS
+    return False
+
+async def resolve_stream_url(video_id, guild_id=None, priority=PLAYBACK):
+    url = stream_resolver.get(video_id)
+    if url:
+        return url
+    download_scheduler.escalate(("stream", video_id), priority)
+    return await download_flights.do(("stream", video_id), fetch_stream_url, video_id, guild_id, priority)
+
+async def fetch_stream_url(video_id, guild_id, priority):
+    async with download_scheduler.slot(guild_id, priority, ("stream", video_id)):
+        return await stream_resolver.resolve(video_id, f"https://www.youtube.com/watch?v={video_id}")
+
+async def track_duration(audio_file, video_id=None):
+    """Track length in seconds without decoding: the index or yt-dlp value, else one cached ffprobe header read."""
+    if is_remote_source(audio_file):
+        return stream_resolver.duration(video_id)
+    return duration_service.cached(audio_file) or await run_blocking_in_executor(duration_service.get, audio_file)
+
+# ffmpeg's own wording for a refused request; the bare status code also shows up inside URLs.
+STREAM_REJECTED = re.compile(r"HTTP error 403|403 Forbidden")
+
+def stream_url_rejected(stream_log):
+    """Reads and closes ffmpeg's stderr log; True if the server refused the URL (expired or revoked)."""
+    try:
+        stream_log.seek(0)
+        return STREAM_REJECTED.search(stream_log.read()) is not None
+    finally:
+        stream_log.close()
+
+def current_stream_log(guild_id):
+    """The stderr log of the guild's streamed track, for sources rebuilt mid-track (volume, seek)."""
+    stream_log = current_tracks.get(guild_id, {}).get("stream_log")
+    return stream_log if stream_log is not None and not stream_log.closed else None
+
+async def acquire_audio(video_id, guild_id):
+    """
+    Gets a queued YouTube track ready to play: the cached file, a direct
+    stream URL (see should_stream), a progressive download or a full
+    download, in that order. Returns (audio_file, stream); audio_file is None
+    if all of them failed.
+    """
+    cached_path = audio_index.path_for("youtube", video_id)
+    if cached_path:
+        return cached_path, None
+    try:
+        if should_stream(video_id, guild_id):
+            try:
+                return await resolve_stream_url(video_id, guild_id), None
+            except PermanentDownloadError:
+                raise
+            except Exception as e:
+                logging.warning(f"[{video_id}] Could not resolve a stream URL, downloading instead: {e}")
+        progressive = await open_progressive_stream(video_id, guild_id)
+        if progressive:
+            return progressive
+    except PermanentDownloadError as e:
+        logging.error(f"[{video_id}] Skipping, the video cannot be played: {e}")
+        return None, None
+    # Joins a preload of the same track if one is still in flight.
+    return await retry_download(video_id, guild_id=guild_id), None
+
+def preload_plan(guild_id, video_id):
+    """Preloader hook: None if video_id is ready to play, else the flight that gets it ready."""
+    if audio_index.path_for("youtube", video_id):
+        return None
+    if should_stream(video_id, guild_id):
+        # Tracks that will be streamed only need their URL resolved ahead of time.
+        if stream_resolver.get(video_id):
+            return None
+        return ("stream", video_id), fetch_stream_url, (video_id, guild_id, PRELOAD)
+    return ("youtube", video_id), fetch_youtube_audio, (video_id, guild_id, PRELOAD)
+
+preloader = Preloader(download_flights, preload_plan, PRELOAD_WINDOW)
+
+def plan_preloads(guild_id):
+    queue = server_queues.get(guild_id)
+    preloader.plan(guild_id, (item[0] for item in queue if item[0][:1] != "|") if queue else ())
+
+def record_download(file_path):
+    """Starts the background analysis of a finished Bandcamp/SoundCloud download (indexed by its streamer) and lets the cache trim itself."""
+    if file_path and os.path.isfile(file_path):
+        analyze_audio(file_path)
+    audio_cache.request_sweep()
+
+async def fetch_imported_track(path, guild_id, priority):
+    source, url = pending_imports[path]
+    fetch = get_bandcamp_audio if source == "bandcamp" else get_soundcloud_audio
+    file_path = await download_scheduler.run(guild_id, priority, fetch, url, audio_index, key=("import", path))
+    record_download(file_path)
+    # If the site's track id differed from the tracklist's, the entry stays
+    # and acquire_imported_track() gets the real file from the index alias.
+    if file_path == path:
+        pending_imports.pop(path, None)
+    return file_path
+
+async def acquire_imported_track(path, guild_id):
+    """File for a queued "|path" track: waits for (or retries) an album/set download. None if it failed."""
+    if path not in pending_imports:
+        return path
+    download_scheduler.escalate(("import", path), PLAYBACK)
+    try:
+        return await download_flights.do(("import", path), fetch_imported_track, path, guild_id, PLAYBACK)
+    except Exception as e:
+        logging.error(f"Error downloading imported track {path}: {e}")
+        return None
+
+async def enqueue_tracklist(ctx, source, url):
+    """
+    Queues a Bandcamp album or SoundCloud set in one step.
+
+    The tracklist comes from a single flat extraction. Every track is queued
+    at once, with its title and page URL, under the file it will be downloaded to; the
+    downloads start right away through the download scheduler (which bounds
+    how many run per guild), the first one at request priority and the rest
+    as bulk, so the first track can play while the others are fetched.
+    """
+    guild_id = ctx.guild.id
+    label = "Bandcamp album" if source == "bandcamp" else "SoundCloud set"
+    await messagesender(bot, ctx.channel.id, f"Processing {label}: <{url}>")
+    try:
+        get_tracklist = get_bandcamp_tracklist if source == "bandcamp" else get_soundcloud_tracklist
+        album_title, entries = await get_tracklist(url)
+    except Exception as e:
+        logging.error(f"Error reading {label} {url}: {e}")
+        entries = []
+    if not entries:
+        await messagesender(bot, ctx.channel.id, f"❌ No tracks found in the {label}.")
+        return
+
+    items = {}
+    missing = []
+    for position, entry in enumerate(entries, start=1):
+        track_id = str(entry["id"])
+        path = audio_index.path_for(source, track_id) or track_file_path(source, track_id)
+        if path in items:
+            continue
+        if not os.path.exists(path):
+            pending_imports[path] = (source, entry["url"])
+            missing.append(path)
+        items[path] = [f"|{path}", entry.get("title") or f"{album_title} - {position}", entry["url"]]
+    async with queue_locks.setdefault(guild_id, asyncio.Lock()):
+        get_guild_queue(guild_id).extend(items.values())
+    first_priority = request_priority(ctx)
+    for position, path in enumerate(missing):
+        download_flights.start(("import", path), fetch_imported_track, path, guild_id, first_priority if position == 0 else BULK)
+
+    await messagesender(bot, ctx.channel.id, f"✅ Added {len(items)} tracks from `{album_title}` to the queue ({len(items) - len(missing)} already cached).")
+    if ctx.voice_client and not ctx.voice_client.is_playing():
+        asyncio.create_task(play_next(ctx, ctx.voice_client))
+
+def request_priority(ctx):
+    """Downloads a user is waiting on jump ahead of preloads only when nothing is playing yet."""
+    return PRELOAD if ctx.voice_client and ctx.voice_client.is_playing() else PLAYBACK
+
 async def check_perms(ctx, guild_id):
     if ctx.author.id in banned_users:
         await messagesender(bot, ctx.channel.id, content="You are banned from using this bot.")
@@ -316,8 +638,7 @@ async def on_voice_state_update(member, before, after):
             if guild_id in guild_volumes:
                 voice_client = guild.voice_client
                 if voice_client and voice_client.source:
-                    voice_client.source = discord.PCMVolumeTransformer(voice_client.source)
-                    voice_client.source.volume = guild_volumes[guild_id] / 100
+                    apply_volume(guild_id, voice_client)
         except Exception:
             logging.exception("Error setting volume after voice state update")
 
@@ -437,7 +758,7 @@ async def get_ctx_from_guild(guild: discord.Guild):
 @bot.event
 async def on_guild_join(guild):
     if guild.id not in server_queues:
-        server_queues[guild.id] = asyncio.Queue()
+        get_guild_queue(guild.id)
         queue_locks[guild.id] = asyncio.Lock()
     await download_guild_icon(guild)
     logging.error(f"Joined new guild: {guild.name}, initialized queue.")
@@ -497,19 +818,23 @@ async def get_related_video(video_id, guild_id, retry_count=3):
     return None
 
 
+BANNED_KEYWORDS = [
+    "drake", "30 for 30 freestyle", "forever (feat kanye west, lil wayne and eminem)",
+    "demons (feat fivio foreign and sosa geek)", "ignant shit", "ice melts (feat young thug)",
+    "take care (feat rihanna)", "controlla", "laugh now cry later", "hold on, we’re going home",
+    "hotline bling", "Dark Lane Demo Tapes", "For All the Dogs", "Some Sexy Songs 4 U",
+    "Certified Lover Boy"
+]
+title_matcher = BlacklistMatcher(BANNED_KEYWORDS, blacklist_data["blacklist"], blacklist_data["whitelist"])
+
+def rebuild_title_matcher():
+    title_matcher.rebuild(blacklist_data["blacklist"], blacklist_data["whitelist"])
+
 def is_banned_title(title):
-    banned_keywords = [
-        "drake", "30 for 30 freestyle", "forever (feat kanye west, lil wayne and eminem)",
-        "demons (feat fivio foreign and sosa geek)", "ignant shit", "ice melts (feat young thug)",
-        "take care (feat rihanna)", "controlla", "laugh now cry later", "hold on, we’re going home",
-        "hotline bling", "Dark Lane Demo Tapes", "For All the Dogs", "Some Sexy Songs 4 U",
-        "Certified Lover Boy"
-    ]
-    
-    title = title.lower().strip()
-    
-    # Check both hardcoded and stored blacklist
-    return any(keyword in title for keyword in banned_keywords) or title in blacklist_data["blacklist"]
+    match = title_matcher.match(title)
+    if match:
+        logging.info(f"Blocked title '{title}' ({match.kind} rule: '{match.rule}')")
+    return match is not None
 
 async def messagesender(bot, channel_id, content=None, embed=None, command_message=None, file=None):
     channel = bot.get_channel(channel_id)
@@ -665,34 +990,135 @@ async def play_next(ctx, voice_client):
             videoinfo = await server_queues[guild_id].get()
             video_id, video_title = videoinfo[0], videoinfo[1]
 
+            if video_title == PENDING_TITLE:
+                try:
+                    video_title = await fetch_pending_title(video_id)
+                except ValueError:
+                    await messagesender(bot, ctx.channel.id, f"🚫 `{video_id}` is blocked and cannot be played.")
+                    continue
+
+            stream = None
             if video_id[:1] == "|":
-                audio_file = video_id[1:]
+                audio_file = await acquire_imported_track(video_id[1:], guild_id)
+                if not audio_file:
+                    await messagesender(bot, ctx.channel.id, "Failed to download the track. Skipping...")
+                    continue
             else:
-                if video_id in preload_tasks:
-                    try:
-                        audio_file = await preload_tasks.pop(video_id)
-                        if not audio_file:
-                            raise ValueError("Preloaded file is None")
-                    except Exception as e:
-                        logging.error(f"Preload task for {video_id} failed or returned None: {e}")
-                        audio_file = await retry_download(video_id)
-                else:
-                    audio_file = await retry_download(video_id)
-
+                preloader.track_started(guild_id, video_id)
+                audio_file, stream = await acquire_audio(video_id, guild_id)
                 if not audio_file:
                     await messagesender(bot, ctx.channel.id, "Failed to download the track. Skipping...")
                     continue 
 
             add_track_to_history(guild_id, video_id, video_title)
-            await play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id)
+            await play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id, stream=stream)
 
         bot.intentional_disconnections[guild_id] = False
 
 
-async def play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id, start_offset: int = 0):
+def normalization_enabled(guild_id):
+    """The guild's !normalize setting, or LOUDNESS_NORMALIZATION if it has none."""
+    enabled = get_server_config(guild_id).get("normalize")
+    return LOUDNESS_NORMALIZATION if enabled is None else enabled
+
+def playback_gain(audio_file, guild_id):
+    """Linear gain for a track: the guild volume times its loudness normalisation (if enabled and analysed)."""
+    gain = guild_volumes.get(guild_id, 100) / 100
+    if not is_remote_source(audio_file) and normalization_enabled(guild_id):
+        entry = audio_index.lookup(audio_file) if audio_file else None
+        if entry:
+            gain *= 10 ** (normalization_gain(entry.get("loudness"), entry.get("true_peak"), LOUDNESS_TARGET) / 20)
+    return round(gain, 4)
+
+def close_with_source(source, reader):
+    """
+    Closes reader when the voice source is cleaned up; with pipe=True py-cord
+    only kills ffmpeg and never closes the object it reads from.
+    """
+    cleanup = source.cleanup
+    def close():
+        try:
+            cleanup()
+        finally:
+            reader.close()
+    source.cleanup = close
+    return source
+
+def create_audio_source(audio_file, guild_id, start_offset=0, stream=None, stderr=None):
+    """
+    Builds the voice source for a file. Volume and loudness normalisation are
+    one ffmpeg volume filter (see playback_gain), so no samples are scaled in
+    Python (except for the rest of a track whose volume is changed mid-play,
+    see apply_volume). Opus files whose gain is within LOUDNESS_TOLERANCE_DB of 0 dB are
+    remuxed straight into Discord's Opus packets (no decode, no re-encode);
+    everything else goes through the PCM path.
+    A stream (GrowingFileReader) is piped into ffmpeg instead of opening audio_file.
+    Seeking into a cached file uses its seek index when built: the file is piped
+    from the nearest indexed page/frame and ffmpeg only trims the remainder;
+    without one ffmpeg seeks on the input side.
+    A remote URL is opened with reconnects enabled and seeked on the input side,
+    so ffmpeg asks the server for a byte range instead of reading up to the offset.
+    """
+    gain = playback_gain(audio_file, guild_id)
+    current_tracks.setdefault(guild_id, {})["gain"] = gain
+    volume_filter = f"-af volume={gain}"
+    if is_remote_source(audio_file):
+        # Errors only: at the default level ffmpeg echoes the URL into the log checked by stream_url_rejected.
+        before_options = f"-loglevel error {STREAM_RECONNECT_OPTIONS}"
+        if start_offset > 0:
+            before_options += f" -ss {start_offset}"
+        return FFmpegPCMAudio(audio_file, executable="ffmpeg", before_options=before_options, options=f"-vn -bufsize 10m {volume_filter}", stderr=stderr)
+    passthrough = (stream is None and OPUS_PASSTHROUGH and gain > 0 and abs(20 * math.log10(gain)) <= LOUDNESS_TOLERANCE_DB
+                   and audio_file.lower().endswith(".opus"))
+    if stream is not None:
+        seek_option = f"-ss {start_offset}" if start_offset > 0 else "-ss 00:00:00"
+        return close_with_source(FFmpegPCMAudio(stream, pipe=True, executable="ffmpeg", options=f"-bufsize 10m {seek_option} {volume_filter}"), stream)
+
+    seek_index = seek_indexes.get(audio_file) if start_offset > 0 else None
+    if seek_index is not None:
+        reader, residual = seek_index.open(audio_file, start_offset)
+        if passthrough:
+            # Copied packets cannot be trimmed; start on the indexed page (at most SEEK_INDEX_INTERVAL early).
+            return close_with_source(FFmpegOpusAudio(reader, pipe=True, codec="copy", executable="ffmpeg"), reader)
+        return close_with_source(FFmpegPCMAudio(reader, pipe=True, executable="ffmpeg", options=f"-bufsize 10m -ss {residual:.3f} {volume_filter}"), reader)
+
+    before_options = f"-ss {start_offset}" if start_offset > 0 else None
+    if passthrough:
+        return FFmpegOpusAudio(audio_file, codec="copy", executable="ffmpeg", before_options=before_options)
+    return FFmpegPCMAudio(audio_file, executable="ffmpeg", before_options=before_options, options=f"-bufsize 10m {volume_filter}")
+
+def apply_volume(guild_id, voice_client):
+    """
+    Applies a volume change to the playing track. A PCM source keeps its
+    ffmpeg process and is scaled by new gain / the gain ffmpeg was started
+    with, so the change is immediate; the next track bakes the new gain into
+    its filter again. Only passthrough Opus (or a source started at gain 0)
+    is restarted at its current position.
+    """
+    track_state = current_tracks.get(guild_id, {})
+    audio_file = track_state.get("audio_file")
+    source = voice_client.source
+    if not audio_file or source is None:
+        return
+    gain = playback_gain(audio_file, guild_id)
+    baked = track_state.get("gain")
+    if baked and not source.is_opus():
+        if isinstance(source, PCMVolumeTransformer):
+            source.volume = gain / baked
+        elif gain != baked:
+            voice_client.source = PCMVolumeTransformer(source, gain / baked)
+        return
+    if gain == baked:
+        return
+    voice_client.source = create_audio_source(audio_file, guild_id, get_current_elapsed_time(guild_id), None, current_stream_log(guild_id))
+    source.cleanup()
+
+async def play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id, start_offset: float = 0, stream=None, announce=True, paused=False):
     guild_id = ctx.guild.id
 
     if is_banned_title(video_title):
+        if stream is not None:
+            stream.close()
         await messagesender(bot, ctx.channel.id, f"🚫 `{video_title}` is blocked and cannot be played.")
         raise ValueError("Out of bounds error: This content is not allowed.")
 
@@ -726,7 +1152,9 @@ async def play_audio_in_thread(voice_client, audio_file, ctx, video_title, video
         )
     except Exception:
         try:
-            duration = int(metadata_manager.ffmpeg_get_track_length(audio_file))
+            if stream is not None:
+                raise ValueError("Track is still downloading")
+            duration = int(await track_duration(audio_file, video_id))
             embed.add_field(
                 name="Duration",
                 value=(f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration != "Unknown" else "Unknown"),
@@ -736,25 +1164,35 @@ async def play_audio_in_thread(voice_client, audio_file, ctx, video_title, video
             embed.add_field(name="Duration", value="Unknown", inline=True)
     embed.set_footer(text=f"ID: {video_id}", icon_url="https://cdn.discordapp.com/avatars/1216449470149955684/137c7c7d86c6d383ae010ca347396b47.webp?size=240")
 
-    await messagesender(bot, ctx.channel.id, embed=embed, file=file)
+    if announce:
+        await messagesender(bot, ctx.channel.id, embed=embed, file=file)
+        if not video_id.startswith("|"):
+            play_counts[video_id] = play_counts.get(video_id, 0) + 1
+            await run_blocking_in_executor(state_store.record_play, video_id)
 
     current_tracks.setdefault(guild_id, {})["current_track"] = [video_id, video_title]
     current_tracks[guild_id]["start_time"] = time.time() - start_offset
+    current_tracks[guild_id]["paused_at"] = None
     current_tracks[guild_id]["audio_file"] = audio_file
+    current_tracks[guild_id]["stream"] = stream
+    audio_index.touch(audio_file)
+    analyze_audio(audio_file)
     update_now_playing(guild_id, video_id, video_title, image_path)
+    # ffmpeg's stderr for a streamed track, checked afterwards for an expired URL.
+    stream_log = tempfile.TemporaryFile(mode="w+") if is_remote_source(audio_file) else None
+    current_tracks[guild_id]["stream_log"] = stream_log
 
     def playback():
         try:
             logging.error(f"Playing: {title} by {artist} in thread")
-            seek_option = f"-ss {start_offset}" if start_offset > 0 else "-ss 00:00:00"
-            source = FFmpegPCMAudio(audio_file, executable="ffmpeg", options=f"-bufsize 10m {seek_option}")
-            volume_level = guild_volumes.get(guild_id, 100) / 100
-            source = discord.PCMVolumeTransformer(source, volume=volume_level)
+            source = create_audio_source(audio_file, guild_id, start_offset, stream, stream_log)
             voice_client.play(source, after=lambda e: logging.error(f"Playback finished: {e}") if e else None)
         except Exception as e:
             logging.error(f"Error during playback: {e}")
+            if stream is not None:
+                stream.close()
     
-    if not audio_file or not os.path.exists(audio_file):
+    if not audio_file or not (is_remote_source(audio_file) or os.path.exists(audio_file)):
         logging.error(f"[Playback Error] Audio file not found: {audio_file}")
         await messagesender(bot, ctx.channel.id, content="❌ Failed to play the track. Skipping...")
 
@@ -764,27 +1202,37 @@ async def play_audio_in_thread(voice_client, audio_file, ctx, video_title, video
         return
 
     await asyncio.to_thread(playback)
+    if paused and voice_client.is_playing():
+        # Comes back the way !pause leaves it; !resume continues from here.
+        voice_client.pause()
+        current_tracks[guild_id]["paused_at"] = time.time()
 
     if guild_id in bot.timeout_tasks:
         bot.timeout_tasks[guild_id].cancel()
 
     bot.timeout_tasks[guild_id] = asyncio.create_task(timeout_handler(ctx))
 
-    if not server_queues[guild_id].empty():
-        try:
-            temp_queue = list(server_queues[guild_id]._queue)
-            for video_id, video_title in temp_queue:
-                if video_id.startswith("|"):
-                    continue
-                logging.info(f"Pre-downloading track: {video_title}")
-                if video_id not in preload_tasks:
-                    preload_tasks[video_id] = asyncio.create_task(download_audio(video_id))
-        except Exception as e:
-            logging.error(f"Error pre-downloading tracks: {e}")
+    try:
+        plan_preloads(guild_id)
+    except Exception as e:
+        logging.error(f"Error pre-downloading tracks: {e}")
 
     while voice_client.is_playing():
         await asyncio.sleep(1)
 
+    if stream_log is not None and stream_url_rejected(stream_log):
+        # The URL expired mid-track: resolve a fresh one and carry on from the same position.
+        if voice_client.is_connected() and current_tracks.get(guild_id, {}).get("audio_file") == audio_file:
+            position = get_current_elapsed_time(guild_id)
+            logging.warning(f"[{video_id}] Stream URL was refused at {position}s, re-resolving.")
+            stream_resolver.invalidate(video_id)
+            try:
+                audio_file = await resolve_stream_url(video_id, guild_id)
+            except Exception as e:
+                logging.error(f"[{video_id}] Could not re-resolve the stream: {e}")
+                return
+            await play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id, start_offset=position, announce=False)
+
 async def safe_voice_connect(bot, guild, voice_channel, max_retries=3, cooldown_seconds=15):
     guild_id = guild.id
 
@@ -831,7 +1279,7 @@ async def safe_voice_connect(bot, guild, voice_channel, max_retries=3, cooldown_
 async def on_ready():
     try:
         from utils.web_app import start_web_server_in_background
-        start_web_server_in_background(server_queues, now_playing, track_history)
+        start_web_server_in_background(server_queues, now_playing, track_history, audio_index, metadata_manager)
         try:
             for vc in bot.voice_clients:
                 await vc.disconnect(force=True)
@@ -839,6 +1287,15 @@ async def on_ready():
             logging.warning(f"No existing voice clients to disconnect: {e}")
 
         logging.error(f"Bot is ready! Logged in as {bot.user}")
+        # Installed here, after bot.run() has set its own handlers that just stop the loop.
+        install_shutdown_handlers()
+        asyncio.create_task(resume_playback_sessions())
+        audio_cache.request_sweep()
+        if not ytdl_backend.processes:
+            asyncio.get_running_loop().run_in_executor(executor, warm_ytdl_pool)
+        if VERIFY_CACHE_CHECKSUMS and not bot.cache_verified:
+            bot.cache_verified = True
+            asyncio.get_running_loop().run_in_executor(executor, download_manager.verify)
         for guild in bot.guilds:
                 file_path = os.path.join('static', f"{guild.id}.png")
                 if not os.path.exists(file_path):
@@ -846,6 +1303,14 @@ async def on_ready():
     except Exception as e:
         logging.error(f"Error in on_ready: {e}")
 
+def warm_ytdl_pool():
+    """Builds the YoutubeDL instances the first search and download will need."""
+    for profile in ("search", "search-fallback", "opus-download"):
+        try:
+            ytdl_pool.warm(profile)
+        except Exception as e:
+            logging.warning(f"Could not pre-build a YoutubeDL for '{profile}': {e}")
+
 def update_now_playing(guild_id, track_id, title, album_art_url):
     now_playing[guild_id] = (track_id, title, album_art_url)
 
@@ -873,6 +1338,39 @@ async def setchannel(ctx, channel: discord.TextChannel):
     update_server_config(ctx.guild.id, "channel", channel.id)
     await messagesender(bot, ctx.channel.id, f"Designated channel updated to: `{channel.name}`")
 
+@bot.command(name="streammode")
+async def streammode(ctx, mode: str = None):
+    if not is_owner_or_server_owner(ctx):
+        await messagesender(bot, ctx.channel.id, content="You don't have permission to use this command.")
+        return
+    if mode is None:
+        current = get_server_config(ctx.guild.id).get("stream_mode")
+        await messagesender(bot, ctx.channel.id, f"Stream mode: `{current or STREAM_MODE}`" + ("" if current else " (default)"))
+        return
+    mode = mode.lower()
+    if mode not in STREAM_MODES + ("default",):
+        await messagesender(bot, ctx.channel.id, f"Usage: `streammode <{'|'.join(STREAM_MODES)}|default>`")
+        return
+    update_server_config(ctx.guild.id, "stream_mode", None if mode == "default" else mode)
+    await messagesender(bot, ctx.channel.id, f"Stream mode updated to: `{STREAM_MODE if mode == 'default' else mode}`")
+
+@bot.command(name="normalize", aliases=["normalise"])
+async def normalize(ctx, mode: str = None):
+    if not is_owner_or_server_owner(ctx):
+        await messagesender(bot, ctx.channel.id, content="You don't have permission to use this command.")
+        return
+    if mode is None:
+        current = get_server_config(ctx.guild.id).get("normalize")
+        enabled = LOUDNESS_NORMALIZATION if current is None else current
+        await messagesender(bot, ctx.channel.id, f"Loudness normalisation: `{'on' if enabled else 'off'}`" + (" (default)" if current is None else ""))
+        return
+    mode = mode.lower()
+    if mode not in ("on", "off", "default"):
+        await messagesender(bot, ctx.channel.id, "Usage: `normalize <on|off|default>`")
+        return
+    update_server_config(ctx.guild.id, "normalize", None if mode == "default" else mode == "on")
+    await messagesender(bot, ctx.channel.id, f"Loudness normalisation updated to: `{mode}` (from the next track)")
+
 @bot.command(name="grablist", aliases=["grabplaylist"])
 async def playlister(ctx, *, search: str = None):
     async with ctx.typing():
@@ -882,7 +1380,7 @@ async def playlister(ctx, *, search: str = None):
             return
     
         if guild_id not in server_queues:
-            server_queues[guild_id] = asyncio.Queue()
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         if search:
@@ -908,23 +1406,8 @@ async def playlister(ctx, *, search: str = None):
                 playlist_title = await get_youtube_playlist_title(playlist_id)
 
             video_ids = await fetch_playlist_videos(ctx, playlist_id, playlist_url)
-            vidscnt = len(video_ids)
-            vidscrn = 0
-            vidsadd = 0
-
-            current_ids = set()
-            scanning_message = await ctx.send("Scanning playlist")
-            for video_id in video_ids:
-                await scanning_message.edit(content=f"Scanning: {video_id} - ({vidscrn}/{vidsadd}/{vidscnt})")
-                vidscrn += 1
-                if video_id not in current_ids:
-                    current_ids.add(video_id)
-                    vidsadd += 1
-                    await server_queues[guild_id].put([video_id, await get_youtube_video_title(video_id)])
-                    await scanning_message.edit(content=f"Scanning: {video_id} - ({vidscrn}/{vidsadd}/{vidscnt})\nAdded: {video_id}!")
-
-            queue_size = server_queues[guild_id].qsize()
-            await scanning_message.edit(content=f"Added {queue_size} tracks from the playlist to the queue.")
+            added = await enqueue_youtube_ids(guild_id, video_ids)
+            scanning_message = await ctx.send(f"Added {added} of {len(video_ids)} tracks from **{playlist_title}** to the queue. Titles are loading in the background.")
 
             if ctx.voice_client is None:
                 channel = ctx.author.voice.channel if ctx.author.voice else None
@@ -947,8 +1430,8 @@ async def play(ctx, *, srch: str):
         if not await check_perms(ctx, guild_id):
             return
 
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
+        if guild_id not in server_queues:
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         connection_success = await handle_voice_connection(ctx)
@@ -982,8 +1465,8 @@ async def youtube(ctx, *, search: str = None):
         if not await check_perms(ctx, guild_id):
             return
 
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
+        if guild_id not in server_queues:
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         await handle_voice_connection(ctx)
@@ -993,17 +1476,8 @@ async def youtube(ctx, *, search: str = None):
                 playlist_id = search.split("list=")[-1]
                 playlist_url = f"https://www.youtube.com/playlist?list={playlist_id}"
                 video_ids = await fetch_playlist_videos(ctx, playlist_id, playlist_url)
-                current_ids = set() 
-
-                scanning_message = await ctx.send(f"Scanning playlist")
-                for video_id in video_ids:
-                    await scanning_message.edit(content=f"Scanned: {video_id}")
-                    if video_id not in current_ids:
-                        current_ids.add(video_id)
-                        await server_queues[guild_id].put([video_id, await get_youtube_video_title(video_id)])
-                        await scanning_message.edit(content=f"added: {video_id}!")
-
-                await messagesender(bot, ctx.channel.id, f"Added {server_queues[guild_id].qsize()} tracks from the playlist to the queue.")
+                added = await enqueue_youtube_ids(guild_id, video_ids)
+                await messagesender(bot, ctx.channel.id, f"Added {added} tracks from the playlist to the queue. Titles are loading in the background.")
                 if not ctx.voice_client.is_playing():
                     await play_next(ctx, ctx.voice_client)
             else:
@@ -1039,43 +1513,20 @@ async def fetch_video_id(ctx, search: str) -> str:
         return await fetch_video_id_from_ytsearch(search, ctx)
 
 async def fetch_video_id_from_ytsearch(search: str, ctx):
-    loop = asyncio.get_running_loop()
-    
-    def run_yt_dlp(opts):
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            try:
-                info = ydl.extract_info(search, download=False)
-                if "entries" not in info or not info["entries"]:
-                    return None
-                return info["entries"][0]["id"]
-            except Exception:
-                return None
-    
-    ydl_opts_music = {
-        "default_search": "ytsearch1",
-        "quiet": True,
-        "no_warnings": True,
-        "youtube_include_dash_manifest": False,
-        "extract_flat": True,
-        "source_address": "0.0.0.0",
-        "geo_bypass": True,
-        "noplaylist": True,
-        "force_generic_extractor": True,
-        "format": "bestaudio",
-        "cookiesfrombrowser": ("chrome",),
-        "youtube_include_hls_manifest": False,
-        "force_url": "https://music.youtube.com/"
-    }
-    
-    result = await loop.run_in_executor(None, lambda: run_yt_dlp(ydl_opts_music))
+    async def run_yt_dlp(profile):
+        try:
+            info = await ytdl_backend.extract(profile, search)
+        except Exception:
+            return None
+        if not info or not info.get("entries"):
+            return None
+        return info["entries"][0]["id"]
+
+    # Try YouTube Music first, then a plain YouTube search.
+    result = await run_yt_dlp("search")
     
     if not result:
-        ydl_opts_regular = {
-            "default_search": "ytsearch1",
-            "quiet": True,
-            "no_warnings": True,
-        }
-        result = await loop.run_in_executor(None, lambda: run_yt_dlp(ydl_opts_regular))
+        result = await run_yt_dlp("search-fallback")
     
     if not result:
         await messagesender(bot, ctx.channel.id, f"Failed to find a song for: `{search}`")
@@ -1083,6 +1534,54 @@ async def fetch_video_id_from_ytsearch(search: str, ctx):
     
     return result
 
+async def enqueue_youtube_ids(guild_id, video_ids):
+    """
+    Queues a list of YouTube ids in one step and returns how many were added.
+
+    Ids are de-duplicated, inserted under the queue lock with a single wake-up,
+    and given a placeholder title that fill_pending_titles() replaces in the
+    background, so playback can start before the playlist has been scanned.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        return 0
+    async with queue_locks.setdefault(guild_id, asyncio.Lock()):
+        get_guild_queue(guild_id).extend([video_id, PENDING_TITLE] for video_id in video_ids)
+    task = asyncio.create_task(fill_pending_titles(guild_id, video_ids))
+    title_fill_tasks.add(task)
+    task.add_done_callback(title_fill_tasks.discard)
+    return len(video_ids)
+
+async def fetch_pending_title(video_id):
+    """Looks up a title under the shared fetch limit. Raises ValueError for banned titles."""
+    async with title_fetch_semaphore:
+        title = await get_youtube_video_title(video_id)
+    return title or video_id
+
+async def fill_pending_titles(guild_id, video_ids):
+    queue = get_guild_queue(guild_id)
+
+    async def fill(video_id):
+        try:
+            async with title_fetch_semaphore:
+                # Skip tracks that were played, removed or cleared while waiting.
+                if video_id not in queue:
+                    return
+                title = await get_youtube_video_title(video_id) or video_id
+        except ValueError:
+            async with queue_locks.setdefault(guild_id, asyncio.Lock()):
+                removed = queue.remove_track(video_id, PENDING_TITLE)
+            if removed:
+                logging.info(f"Dropped banned track {video_id} from the queue for guild {guild_id}.")
+            return
+        except Exception as e:
+            logging.error(f"Failed to fetch title for {video_id}: {e}")
+            title = video_id
+        async with queue_locks.setdefault(guild_id, asyncio.Lock()):
+            queue.retitle(video_id, title, PENDING_TITLE)
+
+    await asyncio.gather(*(fill(video_id) for video_id in video_ids))
+
 async def queue_and_play_next(ctx, guild_id: int, video_id: str, title=None):
     logging.info(f"Queueing video: {video_id} - {title}")
     try:
@@ -1112,15 +1611,22 @@ async def queue_and_play_next(ctx, guild_id: int, video_id: str, title=None):
     except Exception as e:
         await messagesender(bot, ctx.channel.id, f"Error adding to queue: {e}")
 
-def get_current_elapsed_time(guild_id: int) -> int:
+def get_current_elapsed_seconds(guild_id: int) -> float:
     """
-    Returns the elapsed playback time (in seconds) for the current track in the guild.
+    Returns the exact elapsed playback time (in seconds) for the current track in the guild.
     """
     track_state = current_tracks.get(guild_id, {})
     start_time = track_state.get("start_time")
     if start_time is None:
-        return 0
-    return int(time.time() - start_time)
+        return 0.0
+    paused_at = track_state.get("paused_at")
+    return (paused_at or time.time()) - start_time
+
+def get_current_elapsed_time(guild_id: int) -> int:
+    """
+    Returns the elapsed playback time (in whole seconds) for the current track in the guild.
+    """
+    return int(get_current_elapsed_seconds(guild_id))
 
 def retrieve_audio_file_for_current_track(guild_id: int) -> str:
     """
@@ -1129,6 +1635,111 @@ def retrieve_audio_file_for_current_track(guild_id: int) -> str:
     track_state = current_tracks.get(guild_id, {})
     return track_state.get("audio_file", None)
 
+def capture_playback_sessions():
+    """
+    Collects what is needed to pick every playing guild back up after a restart.
+    """
+    sessions = []
+    for guild in bot.guilds:
+        voice_client = guild.voice_client
+        track_state = current_tracks.get(guild.id, {})
+        current_track = track_state.get("current_track")
+        if not voice_client or not voice_client.is_connected() or not current_track:
+            continue
+        sessions.append({
+            "guild_id": guild.id,
+            "track": list(current_track),
+            "audio_file": track_state.get("audio_file"),
+            "position": round(get_current_elapsed_seconds(guild.id), 3),
+            "voice_channel_id": voice_client.channel.id,
+            "text_channel_id": last_active_channels.get(guild.id),
+            "volume": guild_volumes.get(guild.id, 100),
+            "is_looping": track_state.get("is_looping", False),
+            "autoplay": autoplay_enabled.get(guild.id, False),
+            "paused": queue_paused.get(guild.id, False),
+        })
+    return sessions
+
+def save_playback_sessions():
+    try:
+        session_snapshot.save(capture_playback_sessions())
+    except Exception:
+        logging.exception("Failed to snapshot playback sessions")
+
+async def shutdown_on_signal(signame):
+    if bot.is_closed() or bot.shutting_down:
+        return
+    bot.shutting_down = True
+    logging.error(f"Received {signame}; saving playback sessions and shutting down.")
+    save_playback_sessions()
+    await persistence.flush()
+    await bot.close()
+
+def install_shutdown_handlers():
+    """SIGTERM (docker stop) and SIGINT snapshot playback sessions before closing, like !shutdown."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda sig=sig: asyncio.ensure_future(shutdown_on_signal(sig.name)))
+        except NotImplementedError:
+            # No loop signal handlers on Windows; !shutdown still snapshots.
+            pass
+
+async def resume_playback_session(session, handshake_limiter):
+    guild = bot.get_guild(session["guild_id"])
+    voice_channel = guild.get_channel(session["voice_channel_id"]) if guild else None
+    if not voice_channel:
+        logging.warning(f"Cannot resume session for guild {session['guild_id']}: guild or voice channel is gone.")
+        return
+
+    guild_id = guild.id
+    if session.get("text_channel_id"):
+        last_active_channels[guild_id] = session["text_channel_id"]
+    guild_volumes[guild_id] = session.get("volume", 100)
+    autoplay_enabled[guild_id] = session.get("autoplay", False)
+    queue_paused[guild_id] = session.get("paused", False)
+    current_tracks.setdefault(guild_id, {})["is_looping"] = session.get("is_looping", False)
+    get_guild_queue(guild_id)
+    bot.intentional_disconnections[guild_id] = False
+
+    async with handshake_limiter:
+        voice_client = await safe_voice_connect(bot, guild, voice_channel)
+    if not voice_client or not voice_client.is_connected():
+        logging.error(f"[{guild.name}] Could not reconnect voice to resume playback.")
+        return
+
+    video_id, video_title = session["track"]
+    audio_file = session.get("audio_file")
+    stream = None
+    if not audio_file or is_remote_source(audio_file) or not os.path.exists(audio_file):
+        # Stream URLs from before the restart have likely expired; resolve again.
+        audio_file, stream = (None, None) if video_id.startswith("|") else await acquire_audio(video_id, guild_id)
+    if not audio_file:
+        logging.error(f"[{guild.name}] Audio for '{video_title}' is unavailable, continuing with the queue.")
+
+    ctx = await get_ctx_from_guild(guild)
+    if not ctx:
+        return
+
+    logging.info(f"[{guild.name}] Resuming '{video_title}' at {session.get('position', 0)}s after restart.")
+    if audio_file:
+        await play_audio_in_thread(voice_client, audio_file, ctx, video_title, video_id, start_offset=session.get("position", 0), stream=stream, paused=session.get("paused", False))
+    await play_next(ctx, voice_client)
+
+async def resume_playback_sessions():
+    sessions = session_snapshot.take()
+    if not sessions:
+        return
+    logging.info(f"Resuming {len(sessions)} playback sessions from the restart snapshot.")
+    handshake_limiter = asyncio.Semaphore(VOICE_RESUME_CONCURRENCY)
+    results = await asyncio.gather(
+        *(resume_playback_session(session, handshake_limiter) for session in sessions),
+        return_exceptions=True
+    )
+    for session, result in zip(sessions, results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to resume session for guild {session.get('guild_id')}: {result}")
+
 
 @bot.command(name="skip", aliases=["next"])
 async def skip(ctx):
@@ -1151,7 +1762,7 @@ async def stop(ctx):
         if ctx.voice_client:
             bot.intentional_disconnections[guild_id] = True
             await ctx.voice_client.disconnect()
-            server_queues[guild_id] = asyncio.Queue()
+            get_guild_queue(guild_id).clear()
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
             await messagesender(bot, ctx.channel.id, content="Stopped the bot and left the voice channel.")
 
@@ -1165,6 +1776,7 @@ async def pause(ctx):
         if ctx.voice_client and ctx.voice_client.is_playing():
             ctx.voice_client.pause()
             queue_paused[guild_id] = True
+            current_tracks.setdefault(guild_id, {})["paused_at"] = time.time()
             await messagesender(bot, ctx.channel.id, content="Paused the music")
 
 @bot.command(name="resume", aliases=["continue"])
@@ -1177,6 +1789,10 @@ async def resume(ctx):
         if ctx.voice_client and ctx.voice_client.is_paused():
             ctx.voice_client.resume()
             queue_paused[guild_id] = False
+            track_state = current_tracks.setdefault(guild_id, {})
+            if track_state.get("paused_at") and track_state.get("start_time"):
+                track_state["start_time"] += time.time() - track_state["paused_at"]
+            track_state["paused_at"] = None
             await messagesender(bot, ctx.channel.id, content="Resumed the music")
 
 @bot.command(name="queue", aliases=["list"])
@@ -1188,19 +1804,17 @@ async def show_queue(ctx, page: int = 1):
             await messagesender(bot, ctx.channel.id, content="The queue is empty.")
             return
 
-        queue = list(server_queues[guild_id]._queue)
+        queue = server_queues[guild_id]
     
         items_per_page = QUEUE_PAGE_SIZE
-        total_pages = (len(queue) + items_per_page - 1) // items_per_page
+        total_pages = queue.page_count(items_per_page)
     
         if page < 1 or page > total_pages:
             await messagesender(bot, ctx.channel.id, f"Invalid page number. Please enter a number between 1 and {total_pages}.")
             return
 
         start_index = (page - 1) * items_per_page
-        end_index = min(start_index + items_per_page, len(queue))
-    
-        queue_slice = queue[start_index:end_index]
+        queue_slice = queue.page(page, items_per_page)
         embed = discord.Embed(title=f"Music Queue (Page {page} of {total_pages})", color=discord.Color.blue())
     
         for index, item in enumerate(queue_slice, start=start_index + 1):
@@ -1219,26 +1833,24 @@ async def search(ctx, *, query: str):
         if not await check_perms(ctx, guild_id):
             return
     
-        ydl_opts = {"default_search": "ytsearch10", "quiet": True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(query, download=False)
-                results = info['entries']
-            
-                if not results:
-                    await messagesender(bot, ctx.channel.id, content="No search results found.")
-                    return
-            
-                embed = discord.Embed(title=f"Search Results: {query}", color=discord.Color.green())
-                for entry in results[:10]:
-                    video_id = entry['id']
-                    video_title = entry['title']
-                
-                    embed.add_field(name=video_title, value=f"```{ctx.prefix}yt {video_id}```", inline=False)
-                await messagesender(bot, ctx.channel.id, embed=embed)
+        try:
+            info = await ytdl_backend.extract("search-list", query)
+            results = info['entries']
         
-            except Exception as e:
-                await messagesender(bot, ctx.channel.id, f"Failed to search: {e}")
+            if not results:
+                await messagesender(bot, ctx.channel.id, content="No search results found.")
+                return
+        
+            embed = discord.Embed(title=f"Search Results: {query}", color=discord.Color.green())
+            for entry in results[:10]:
+                video_id = entry['id']
+                video_title = entry['title']
+            
+                embed.add_field(name=video_title, value=f"```{ctx.prefix}yt {video_id}```", inline=False)
+            await messagesender(bot, ctx.channel.id, embed=embed)
+    
+        except Exception as e:
+            await messagesender(bot, ctx.channel.id, f"Failed to search: {e}")
 
 @bot.command(name="clear")
 async def clear(ctx):
@@ -1249,7 +1861,7 @@ async def clear(ctx):
         
         async with queue_locks.setdefault(guild_id, asyncio.Lock()):
             if server_queues.get(guild_id):
-                server_queues[guild_id]._queue.clear()
+                server_queues[guild_id].clear()
         await messagesender(bot, ctx.channel.id, content="Cleared the queue.")
 
 @bot.command(name="remove")
@@ -1261,7 +1873,7 @@ async def remove(ctx, index: int):
         
         async with queue_locks.setdefault(guild_id, asyncio.Lock()):
             try:
-                removed = server_queues[guild_id]._queue.pop(index - 1)
+                removed = get_guild_queue(guild_id).remove(index - 1)
                 await messagesender(bot, ctx.channel.id, f"Removed track {removed} from the queue.")
             except IndexError:
                 await messagesender(bot, ctx.channel.id, content="Invalid index.")
@@ -1316,10 +1928,10 @@ async def nowplaying(ctx):
             embed.add_field(name="Duration", value=f"{duration // 60}:{duration % 60:02d}" if duration != "Unknown" else "Unknown", inline=True)
         except Exception as e:
             try:
-                duration = metadata_manager.ffmpeg_get_track_length(audio_file)
+                duration = int(await track_duration(current_tracks[guild_id].get("audio_file"), video_id))
                 embed.add_field(name="Duration", value=f"{duration // 60}:{duration % 60:02d}" if duration != "Unknown" else "Unknown", inline=True)
             except Exception as e:
-                Embed.add_field(name="Duration", value="Unknown", inline=True)
+                embed.add_field(name="Duration", value="Unknown", inline=True)
         embed.set_footer(text=f"ID: {video_id}", icon_url="https://cdn.discordapp.com/avatars/1216449470149955684/137c7c7d86c6d383ae010ca347396b47.webp?size=240")
 
         await messagesender(bot, ctx.channel.id, embed=embed, file=file)
@@ -1329,6 +1941,8 @@ async def shutdown(ctx):
     logging.error(f"Requesting ID: {ctx.author.id}\nOwner ID:{BOT_OWNER_ID}")
     if ctx.author.id == BOT_OWNER_ID:
         await messagesender(bot, ctx.channel.id, content="Shutting down.")
+        save_playback_sessions()
+        await persistence.flush()
         await bot.close()
     else:
         await messagesender(bot, ctx.channel.id, content="You do not have permission to shut down the bot.")
@@ -1338,6 +1952,8 @@ async def reboot(ctx):
     logging.error(f"Requesting ID: {ctx.author.id}\nOwner ID:{BOT_OWNER_ID}")
     if ctx.author.id == BOT_OWNER_ID:
         await messagesender(bot, ctx.channel.id, content="Restarting the bot...")
+        save_playback_sessions()
+        await persistence.flush()
         os.execv(sys.executable, ['python'] + sys.argv)
     else:
         await messagesender(bot, ctx.channel.id, content="You do not have permission to restart the bot.")
@@ -1347,6 +1963,8 @@ async def dockboot(ctx):
     logging.error(f"Requesting ID: {ctx.author.id}\nOwner ID: {BOT_OWNER_ID}")
     if ctx.author.id == BOT_OWNER_ID:
         await messagesender(bot, ctx.channel.id, content="Shutting down and restarting")
+        save_playback_sessions()
+        await persistence.flush()
         subprocess.Popen(["/bin/bash", "init.sh"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         os._exit(0)  
     else:
@@ -1402,32 +2020,20 @@ async def seek(ctx, position: str):
             return
     
         video_id = current_track[0] 
-        audio_file = f"music/{video_id}.mp3"
-        if not os.path.exists(audio_file):
-            audio_file = f"music/{video_id}.opus"
-        if not os.path.exists(audio_file):
+        cached = audio_index.lookup(video_id)
+        playing_file = current_tracks[guild_id].get("audio_file")
+        if cached:
+            audio_file = cached["path"]
+        elif is_remote_source(playing_file):
+            audio_file = await resolve_stream_url(video_id, guild_id)
+        else:
             await messagesender(bot, ctx.channel.id, content="Audio file not found for seeking.")
             return
-        def get_audio_duration(file_path):
-            try:
-                result = subprocess.run(
-                    ["ffmpeg", "-i", file_path, "-f", "null", "-"],
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                duration_line = [line for line in result.stderr.split("\n") if "Duration" in line]
-                if duration_line:
-                    time_str = duration_line[0].split(",")[0].split("Duration:")[1].strip()
-                    h, m, s = map(float, time_str.split(":"))
-                    return int(h * 3600 + m * 60 + s)
-            except Exception as e:
-                logging.error(f"Error getting duration: {e}")
-            return None
-
-        duration = get_audio_duration(audio_file)
+        duration = await track_duration(audio_file, video_id)
         if not duration:
             await messagesender(bot, ctx.channel.id, content="Could not determine audio duration.")
             return
+        duration = int(duration)
 
         try:
             if position.endswith("%"):
@@ -1445,9 +2051,11 @@ async def seek(ctx, position: str):
                 raise ValueError(f"Position must be between 0 and {duration} seconds.")
 
             ctx.voice_client.stop()
-            ffmpeg_options = f"-ss {seconds} -bufsize 10m"
-            source = FFmpegPCMAudio(audio_file, executable="ffmpeg", options=ffmpeg_options)
+            source = create_audio_source(audio_file, guild_id, seconds, stderr=current_stream_log(guild_id))
             ctx.voice_client.play(source, after=lambda _: asyncio.run_coroutine_threadsafe(play_next(ctx, ctx.voice_client), bot.loop))
+            current_tracks[guild_id]["audio_file"] = audio_file
+            current_tracks[guild_id]["start_time"] = time.time() - seconds
+            current_tracks[guild_id]["paused_at"] = None
 
             await messagesender(bot, ctx.channel.id, f"⏩ Seeking to `{seconds}` seconds.")
     
@@ -1500,6 +2108,7 @@ async def help_command(ctx):
         setprefix <p>      | prefix         | Change the bot prefix
         setdjrole <r>      | setrole        | Assign DJ role
         setchannel <c>     | None           | Restrict bot to a channel
+        streammode <m>     | None           | Stream, cache or auto per track
         debugmode          | None           | Toggle debug logging
         showstats          | None           | Toggle bot stats in profile
         
@@ -1562,7 +2171,7 @@ async def lyrics(ctx, *, song: str = None):
         if not await check_perms(ctx, guild_id):
             return
         
-        queue = list(server_queues.get(guild_id, asyncio.Queue())._queue)   
+        queue = get_guild_queue(guild_id).snapshot()
         lyrics_fetcher = Lyrics(ctx, queue)
 
         try:
@@ -1614,10 +2223,9 @@ async def volume(ctx, volume: int):
             return
         
         if 0 <= volume <= 200:
-            ctx.voice_client.source = discord.PCMVolumeTransformer(ctx.voice_client.source)
-            ctx.voice_client.source.volume = volume / 100
             guild_volumes[guild_id] = volume
-            save_volume_settings(guild_volumes)
+            apply_volume(guild_id, ctx.voice_client)
+            persistence.schedule(("volume", guild_id), state_store.set_volume, guild_id, volume)
             await messagesender(bot, ctx.channel.id, f"Volume set to {volume}% and saved.")
         else:
             await messagesender(bot, ctx.channel.id, content="Volume must be between 0 and 200.")
@@ -1630,8 +2238,8 @@ async def shuffle_queue(ctx):
             return
         
         async with queue_locks.setdefault(guild_id, asyncio.Lock()):
-            if server_queues.get(guild_id) and len(server_queues[guild_id]._queue) > 1:
-                random.shuffle(server_queues[guild_id]._queue)
+            if server_queues.get(guild_id) and len(server_queues[guild_id]) > 1:
+                server_queues[guild_id].shuffle()
                 await messagesender(bot, ctx.channel.id, content="The queue has been shuffled! 🔀")
             else:
                 await messagesender(bot, ctx.channel.id, content="The queue is too short to shuffle.")
@@ -1652,13 +2260,11 @@ async def move_song(ctx, from_pos: int, to_pos: int):
             return
         
         async with queue_locks.setdefault(guild_id, asyncio.Lock()):
-            queue = server_queues.get(guild_id)._queue if server_queues.get(guild_id) else None
+            queue = server_queues.get(guild_id)
             if queue and 1 <= from_pos <= len(queue) and 1 <= to_pos <= len(queue):
                 from_pos -= 1
                 to_pos -= 1
-                track = queue[from_pos]
-                del queue[from_pos]
-                queue.insert(to_pos, track)
+                track = queue.move(from_pos, to_pos)
                 await messagesender(bot, ctx.channel.id, f"Moved **{''.join(track[1:])}** from position {from_pos + 1} to {to_pos + 1}.")
             else:
                 await messagesender(bot, ctx.channel.id, content="Invalid positions. Please provide valid track numbers from the queue.")
@@ -1694,6 +2300,7 @@ async def leave_channel(ctx):
         if ctx.voice_client:
             bot.intentional_disconnections[guild_id] = True
             await ctx.voice_client.disconnect()
+            preloader.stop(guild_id)
             await messagesender(bot, ctx.channel.id, content="Disconnected from the voice channel. 👋")
         else:
             await messagesender(bot, ctx.channel.id, content="I'm not in a voice channel to leave.")
@@ -1711,7 +2318,7 @@ async def forceplay(ctx, *, query: str):
 
     if ctx.voice_client and ctx.voice_client.is_playing():
         logging.error("Having to move things.")
-        queue = server_queues.get(guild_id)._queue if server_queues.get(guild_id) else None
+        queue = server_queues.get(guild_id)
 
         if queue and len(queue) > 1: 
             from_pos = len(queue) - 1
@@ -1719,9 +2326,7 @@ async def forceplay(ctx, *, query: str):
             try:
                 from_pos -= 1
                 to_pos -= 1
-                track = queue[from_pos]
-                del queue[from_pos]
-                queue.insert(to_pos, track)
+                queue.move(from_pos, to_pos)
             except IndexError:
                 logging.error("Error moving track in fplay: Invalid index")
 
@@ -1735,10 +2340,10 @@ async def backup_queue(ctx, scope: str = "guild"):
         return
     
     if scope == "global":
-        save_queue_backup()
+        await save_queue_backup()
         await messagesender(bot, ctx.channel.id, content="Global queue backup saved.")
     else:
-        save_queue_backup(ctx.guild.id)
+        await save_queue_backup(ctx.guild.id)
         await messagesender(bot, ctx.channel.id, content=f"Queue backup saved for {ctx.guild.name}.")
 
 @bot.command(name="restorequeue")
@@ -1750,21 +2355,17 @@ async def restore_queue(ctx, scope: str = "guild"):
     if scope == "global":
         backup_data = load_queue_backup()
         for gid, queue_data in backup_data.items():
-            if gid not in server_queues:
-                server_queues[gid] = asyncio.Queue()
-                queue_locks[gid] = asyncio.Lock()
-            async with queue_locks[gid]:
-                for item in queue_data:
-                    await server_queues[gid].put(item)
+            gid = int(gid)
+            async with queue_locks.setdefault(gid, asyncio.Lock()):
+                get_guild_queue(gid).extend(queue_data)
+            restore_pending_imports(queue_data)
         await messagesender(bot, ctx.channel.id, content="Global queue restored.")
     else:
         backup_data = load_queue_backup(ctx.guild.id)
-        if ctx.guild.id not in server_queues:
-            server_queues[ctx.guild.id] = asyncio.Queue()
-            queue_locks[ctx.guild.id] = asyncio.Lock()
-        async with queue_locks[ctx.guild.id]:
-            for item in backup_data.get(str(ctx.guild.id), []):
-                await server_queues[ctx.guild.id].put(item)
+        queue_data = backup_data.get(str(ctx.guild.id), [])
+        async with queue_locks.setdefault(ctx.guild.id, asyncio.Lock()):
+            get_guild_queue(ctx.guild.id).extend(queue_data)
+        restore_pending_imports(queue_data)
         await messagesender(bot, ctx.channel.id, content=f"Queue restored for {ctx.guild.name}.")
 
 @bot.command(name="banuser")
@@ -1774,7 +2375,7 @@ async def banuser(ctx, user: discord.User):
         return
     
     banned_users[user.id] = user.name
-    save_banned_users(banned_users)
+    persistence.schedule(("banned", user.id), state_store.ban_user, user.id, user.name)
     await messagesender(bot, ctx.channel.id, content=f"{user.name} has been banned from using the bot.")
 
 @bot.command(name="unbanuser")
@@ -1785,7 +2386,7 @@ async def unbanuser(ctx, user: discord.User):
     
     if user.id in banned_users:
         del banned_users[user.id]
-        save_banned_users(banned_users)
+        persistence.schedule(("banned", user.id), state_store.unban_user, user.id)
         await messagesender(bot, ctx.channel.id, content=f"{user.name} has been unbanned from using the bot.")
     else:
         await messagesender(bot, ctx.channel.id, content=f"{user.name} is not banned.")
@@ -1890,17 +2491,12 @@ async def sendmp3(ctx):
                 await messagesender(bot, ctx.channel.id, content="No current track found.")
                 return
             video_id = current_track[0]
-            possible_extensions = [".mp3", ".opus"]
-            file_path = None
-            for ext in possible_extensions:
-                path = f"music/{video_id}{ext}"
-                if os.path.exists(path):
-                    file_path = path
-                    break
-            if not file_path:
+            cached = audio_index.lookup(video_id)
+            if not cached:
                 await messagesender(bot, ctx.channel.id, content="File not found.")
                 return
-            file_size = os.path.getsize(file_path)
+            file_path = cached["path"]
+            file_size = cached["size"]
             if file_size > 8 * 1024 * 1024:
                 zip_path = file_path + ".zip"
                 try:
@@ -1938,9 +2534,14 @@ async def blacklist(ctx, *, song: str):
         await messagesender(bot, ctx.channel.id, content="You don't have permission to use this command.")
         return
     
-    if song.lower() not in blacklist_data["blacklist"]:
-        blacklist_data["blacklist"].append(song.lower())
-        save_blacklist(blacklist_data)
+    title = normalize_title(song)
+    if title not in blacklist_data["blacklist"]:
+        blacklist_data["blacklist"].append(title)
+        persistence.schedule(("title_filter", "blacklist", title), state_store.add_title_filter, "blacklist", title)
+        if title in blacklist_data["whitelist"]:
+            blacklist_data["whitelist"].remove(title)
+            persistence.schedule(("title_filter", "whitelist", title), state_store.remove_title_filter, "whitelist", title)
+        rebuild_title_matcher()
         await messagesender(bot, ctx.channel.id, content=f"`{song}` has been blacklisted.")
     else:
         await messagesender(bot, ctx.channel.id, content=f"`{song}` is already blacklisted.")
@@ -1951,17 +2552,25 @@ async def whitelist(ctx, *, song: str):
         await messagesender(bot, ctx.channel.id, content="You don't have permission to use this command.")
         return
     
-    if song.lower() in blacklist_data["blacklist"]:
-        blacklist_data["blacklist"].remove(song.lower())
-        save_blacklist(blacklist_data)
+    title = normalize_title(song)
+    if title in blacklist_data["blacklist"]:
+        blacklist_data["blacklist"].remove(title)
+        persistence.schedule(("title_filter", "blacklist", title), state_store.remove_title_filter, "blacklist", title)
+        rebuild_title_matcher()
         await messagesender(bot, ctx.channel.id, content=f"`{song}` has been removed from the blacklist.")
+    elif title_matcher.match(title):
+        blacklist_data["whitelist"].append(title)
+        persistence.schedule(("title_filter", "whitelist", title), state_store.add_title_filter, "whitelist", title)
+        rebuild_title_matcher()
+        await messagesender(bot, ctx.channel.id, content=f"`{song}` has been whitelisted and overrides the keyword filter.")
     else:
         await messagesender(bot, ctx.channel.id, content=f"`{song}` is not in the blacklist.")
 
 @bot.command(name="blacklistcheck")
 async def blacklist_check(ctx, *, song: str):
-    if is_banned_title(song):
-        await messagesender(bot, ctx.channel.id, content=f"`{song}` is blacklisted.")
+    match = title_matcher.match(song)
+    if match:
+        await messagesender(bot, ctx.channel.id, content=f"`{song}` is blacklisted ({match.kind} rule: `{match.rule}`).")
     else:
         await messagesender(bot, ctx.channel.id, content=f"`{song}` is not blacklisted.")
 
@@ -1972,7 +2581,7 @@ async def toggle_debug(ctx):
         return
     
     debug_config["debug"] = not debug_config["debug"]
-    save_debug_mode(debug_config)
+    persistence.schedule(("setting", "debug"), state_store.set_setting, "debug", debug_config["debug"])
     state = "enabled" if debug_config["debug"] else "disabled"
     await messagesender(bot, ctx.channel.id, content=f"Debug mode has been {state}.")
 
@@ -1984,14 +2593,19 @@ async def bandcamp(ctx, url: str):
         if not await check_perms(ctx, guild_id):
             return
 
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
+        if guild_id not in server_queues:
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         await handle_voice_connection(ctx)
+
+        if BandcampAudioStreamer.is_album_url(url):
+            await enqueue_tracklist(ctx, "bandcamp", url)
+            return
     
         await messagesender(bot, ctx.channel.id, f"Processing Bandcamp link: <{url}>")
-        file_path = await get_bandcamp_audio(url)
+        file_path = await download_flights.do(("bandcamp", canonical_page_url(url)), download_scheduler.run, guild_id, request_priority(ctx), get_bandcamp_audio, url, audio_index)
+        record_download(file_path)
         if file_path:
             trackdata = await get_bandcamp_title(url)
             await queue_and_play_next(ctx, ctx.guild.id, file_path, trackdata)
@@ -2006,14 +2620,19 @@ async def soundcloud(ctx, url: str):
         if not await check_perms(ctx, guild_id):
             return
 
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
+        if guild_id not in server_queues:
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         await handle_voice_connection(ctx)
+
+        if SoundCloudAudioStreamer.is_set_url(url):
+            await enqueue_tracklist(ctx, "soundcloud", url)
+            return
     
         await messagesender(bot, ctx.channel.id, f"Processing SoundCloud link: <{url}>")
-        file_path = await get_soundcloud_audio(url)
+        file_path = await download_flights.do(("soundcloud", canonical_page_url(url)), download_scheduler.run, guild_id, request_priority(ctx), get_soundcloud_audio, url, audio_index)
+        record_download(file_path)
         soundcloud_title = await get_soundcloud_title(url)
         if file_path:
             await queue_and_play_next(ctx, ctx.guild.id, file_path, soundcloud_title)
@@ -2029,7 +2648,7 @@ async def spotify(ctx, url: str):
             return
 
         if guild_id not in server_queues:
-            server_queues[guild_id] = asyncio.Queue()
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         await handle_voice_connection(ctx)
@@ -2062,26 +2681,23 @@ async def spotify(ctx, url: str):
             bar = "█" * filled_length + "░" * (bar_length - filled_length)
             await progress_message.edit(content=f"🔄 Processing Spotify\n[{bar}] {current}/{total_tracks}")
 
-        def _download_sync(ydl_opts, url):
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.extract_info("https://music.youtube.com/watch?v=" + url, download=True)
-
-        async def S_download_audio(youtube_link):
+        async def S_fetch_audio(youtube_link):
             output_path = f"music/{youtube_link}.mp3"
-            ydl_opts = {
-                'format': 'bestaudio[acodec^=opus]/bestaudio',
-                'cookies': "/config/cookies.txt",
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '320',
-                }],
-                'outtmpl': f'music/%(id)s',
-            }
+            async with download_scheduler.slot(guild_id, BULK if total_tracks > 1 else PLAYBACK):
+                await ytdl_backend.extract("mp3-download", "https://music.youtube.com/watch?v=" + youtube_link, download=True)
+            _, checksum = await run_blocking_in_executor(commit_download, staged_path(f"{youtube_link}.mp3"), output_path)
+            audio_index.record("youtube", youtube_link, output_path, bitrate=320, checksum=checksum)
+            analyze_audio(output_path)
+            audio_cache.request_sweep()
+            return output_path
 
+        async def S_download_audio(youtube_link):
+            cached_path = audio_index.path_for("youtube", youtube_link)
+            if cached_path:
+                return cached_path
             try:
-                await run_blocking_in_executor(_download_sync, ydl_opts, youtube_link)
-                return output_path
+                # Shares the yt-dlp run with any other download of this video (same music/<id> output).
+                return await download_flights.do(("youtube", youtube_link), S_fetch_audio, youtube_link)
             except Exception as e:
                 logging.error(f"Error downloading mp3 format from {youtube_link}: {e}")
                 return False
@@ -2130,8 +2746,8 @@ async def applemusic(ctx, url: str):
         if not await check_perms(ctx, guild_id):
             return
 
-        if not server_queues.get(guild_id):
-            server_queues[guild_id] = asyncio.Queue()
+        if guild_id not in server_queues:
+            get_guild_queue(guild_id)
             current_tracks[guild_id] = {"current_track": None, "is_looping": False}
 
         await handle_voice_connection(ctx)
@@ -2233,6 +2849,28 @@ async def metrics(ctx):
             bot_embed.add_field(name="Total Queued", value=total_tracks_queued, inline=True)
             bot_embed.add_field(name="Total History", value=total_history, inline=True)
 
+            cache_limit = f"{AUDIO_CACHE_MAX_MB / 1024:.1f} GB" if AUDIO_CACHE_MAX_MB > 0 else "unlimited"
+            bot_embed.add_field(name="Audio Cache", value=f"{audio_cache.total_bytes / (1024**3):.2f} GB / {cache_limit}\n{audio_cache.evicted_files} evicted", inline=True)
+
+            download_stats = download_scheduler.stats()
+            bot_embed.add_field(name="Downloads Active", value=f"{download_stats['active']}/{download_stats['limit']} (max {download_stats['per_guild']} per guild)", inline=True)
+            bot_embed.add_field(name="Downloads Shared", value=f"{download_flights.joined} joined / {download_flights.started} started", inline=True)
+            preload_stats = preloader.stats()
+            hit_rate = f"{preload_stats['hit_rate']:.0%}" if preload_stats['hit_rate'] is not None else "n/a"
+            bot_embed.add_field(name="Preload", value=f"{hit_rate} ready ({preload_stats['hits']} hit / {preload_stats['late']} late / {preload_stats['misses']} miss), {preload_stats['active']} active, {preload_stats['cancelled']} cancelled", inline=True)
+            if ytdl_backend.processes:
+                workers = ytdl_backend.processes
+                bot_embed.add_field(name="yt-dlp Workers", value=f"{workers.workers} processes, {workers.calls} calls, {workers.restarts} restarts", inline=True)
+            else:
+                pool_stats = ytdl_pool.stats()
+                bot_embed.add_field(name="yt-dlp Pool", value=f"{pool_stats['reused']} reused / {pool_stats['created']} built ({pool_stats['idle']} idle)", inline=True)
+            for class_name, class_stats in download_stats["classes"].items():
+                bot_embed.add_field(
+                    name=f"Downloads: {class_name.title()}",
+                    value=f"{class_stats['queued']} waiting, {class_stats['started']} started\nwait avg {class_stats['avg_wait']:.1f}s / max {class_stats['max_wait']:.1f}s",
+                    inline=True
+                )
+
             await messagesender(bot, ctx.channel.id, embed=sys_embed)
             await messagesender(bot, ctx.channel.id, embed=bot_embed)
 
@@ -2246,7 +2884,7 @@ async def toggle_stats(ctx):
         return
     
     stats_config["show_stats"] = not stats_config["show_stats"]
-    save_stats_config(stats_config)
+    persistence.schedule(("setting", "show_stats"), state_store.set_setting, "show_stats", stats_config["show_stats"])
     
     await update_bot_presence()
     
@@ -2259,14 +2897,12 @@ async def purge_queues(ctx):
         await messagesender(bot, ctx.channel.id, content="You don't have permission to use this command.")
         return
     
-    global server_queues
     cleared_count = 0
     
     for guild_id in list(server_queues.keys()):
-        if isinstance(server_queues[guild_id], asyncio.Queue):
-            async with queue_locks.setdefault(guild_id, asyncio.Lock()):
-                server_queues[guild_id] = asyncio.Queue()
-            cleared_count += 1
+        async with queue_locks.setdefault(guild_id, asyncio.Lock()):
+            server_queues[guild_id].clear()
+        cleared_count += 1
     
     await messagesender(bot, ctx.channel.id, content=f"Cleared queues for {cleared_count} servers.")
 
@@ -2479,16 +3115,14 @@ async def clean_file(ctx, ID: str):
         await ctx.send("❌ You do not have permission to clean this ID.")
         return
 
-    file_path = f"music/{ID}"
-    if not os.path.exists(file_path):
-        file_path = f"music/{ID}.mp3"
-    if not os.path.exists(file_path):
-        file_path = f"music/{ID}.opus"
-    if not os.path.exists(file_path):
+    cached = audio_index.lookup(ID)
+    if not cached:
         await ctx.send(f"❌ File not found for ID: {ID}")
         return
 
+    file_path = cached["path"]
     try:
+        audio_index.remove_path(file_path)
         os.remove(file_path)
         await ctx.send(f"✅ Cleaned {ID} from database.")
     except Exception as e:
@@ -2535,7 +3169,10 @@ async def update_yt_dlp(ctx):
 
         if yt_proc.returncode == 0:
             output = stdout.decode().strip()
-            await messagesender(bot, ctx.channel.id, content=f"✅ yt-dlp updated:\n```\n{output}\n```")
+            await messagesender(bot, ctx.channel.id, content=f"✅ yt-dlp updated:\n```\n{output}\n```\nRestarting to load it; playback resumes where it left off.")
+            save_playback_sessions()
+            await persistence.flush()
+            os.execv(sys.executable, ['python'] + sys.argv)
         else:
             error = stderr.decode().strip()
             await messagesender(bot, ctx.channel.id, content=f"❌ Update failed:\n```\n{error}\n```")
@@ -91,6 +91,7 @@ REPO_URLS=(
 FILES=(
     "bot3.py" 
     "utils/youtube_pl.py" "utils/voice_utils.py" "utils/albumart.py" "utils/metadata.py" "utils/web_app.py" "utils/lyrics.py"
+    "utils/common.py" "utils/state_store.py" "utils/persistence.py" "utils/queue_journal.py" "utils/session_snapshot.py" "utils/blacklist.py" "utils/guild_queue.py" "utils/download_scheduler.py" "utils/audio_cache.py" "utils/audio_index.py" "utils/single_flight.py" "utils/progressive.py" "utils/stream_resolver.py" "utils/ytdl_pool.py" "utils/ytdl_backend.py" "utils/preloader.py" "utils/loudness.py" "utils/duration.py" "utils/seek_index.py" "utils/download_manager.py"
     "sources/youtube_mp3.py" "sources/spotify_mp3.py" "sources/soundcloud_mp3.py" "sources/bandcamp_mp3.py" "sources/apple_music_mp3.py"
 )
 
@@ -1,16 +1,20 @@
 import asyncio
-import yt_dlp
 import os
 import re
 import aiohttp
 from bs4 import BeautifulSoup
 import logging
 
+from utils.ytdl_backend import ytdl_backend
+from utils.common import canonical_page_url
+from utils.download_manager import commit_download
+
 class BandcampAudioStreamer:
-    def __init__(self, url):
+    def __init__(self, url, index=None):
         if not self.validate_url(url):
             raise ValueError("Invalid Bandcamp URL")
         self.url = url
+        self.index = index
         logging.error(f"Initialized BandcampAudioStreamer with URL: {url}")
 
     @staticmethod
@@ -19,41 +23,51 @@ class BandcampAudioStreamer:
         logging.error(f"Validating URL: {url}, Result: {valid}")
         return valid
 
+    @staticmethod
+    def is_album_url(url: str) -> bool:
+        return re.match(r'https?://[\w.-]+\.bandcamp\.com/album/[\w-]+', url) is not None
+
     async def download_and_convert(self):
-        output_path = f"music/{self.url.split('/')[-1]}"
-        if os.path.exists(output_path):
-            logging.error(f"File already cached: {output_path}")
-            return output_path
-        
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'outtmpl': output_path,
-        }
-        
+        page_url = canonical_page_url(self.url)
+        if self.index:
+            cached = self.index.resolve_alias("bandcamp", page_url)
+            if cached:
+                logging.error(f"File already cached: {cached['path']}")
+                return cached["path"]
+
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._download_sync, ydl_opts)
-            return f"{output_path}.mp3"
+            logging.error(f"Executing yt-dlp download for {self.url}")
+            record = await ytdl_backend.download_track(self.url, "bandcamp")
+            logging.error("yt-dlp download complete")
         except Exception as e:
             logging.error(f"Error downloading Bandcamp audio: {e}")
             return None
+        checksum = None
+        if record["staged"]:
+            if not os.path.exists(record["staged"]):
+                logging.error(f"Bandcamp download produced no file for {self.url}")
+                return None
+            _, checksum = await asyncio.get_event_loop().run_in_executor(None, commit_download, record["staged"], record["path"])
+        if self.index:
+            track_id = str(record["id"])
+            # A file that was already there keeps its entry (and its loudness analysis).
+            if record["staged"] or not self.index.get("bandcamp", track_id):
+                self.index.record("bandcamp", track_id, record["path"], codec="mp3", bitrate=320, duration=record.get("duration"), checksum=checksum)
+            self.index.add_alias("bandcamp", page_url, track_id)
+        return record["path"]
 
-    def _download_sync(self, ydl_opts):
-        logging.error(f"Executing yt-dlp download for {self.url}")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(self.url, download=True)
-        logging.error("yt-dlp download complete")
-
-async def get_bandcamp_audio(url):
+async def get_bandcamp_audio(url, index=None):
     logging.error(f"Fetching Bandcamp audio for URL: {url}")
-    streamer = BandcampAudioStreamer(url)
+    streamer = BandcampAudioStreamer(url, index)
     return await streamer.download_and_convert()
 
+async def get_bandcamp_tracklist(url):
+    """Flat-extracts an album in one request: (album title, [{"id", "title", "url"}, ...]) in album order."""
+    logging.error(f"Fetching Bandcamp tracklist for URL: {url}")
+    record = await ytdl_backend.extract("tracklist", url)
+    entries = [entry for entry in record.get("entries") or [] if entry.get("id") and entry.get("url")]
+    return record.get("title") or "Bandcamp album", entries
+
 async def get_bandcamp_title(url):
     pattern = re.compile(r"https?://[\w.-]+\.bandcamp\.com/track/[\w-]+")
 
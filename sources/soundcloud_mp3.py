@@ -1,5 +1,4 @@
 import asyncio
-import yt_dlp
 import os
 import re
 import requests
@@ -7,48 +6,63 @@ from bs4 import BeautifulSoup
 import aiohttp
 import logging
 
+from utils.ytdl_backend import ytdl_backend
+from utils.common import canonical_page_url
+from utils.download_manager import commit_download
+
 class SoundCloudAudioStreamer:
-    def __init__(self, url):
+    def __init__(self, url, index=None):
         if not self.validate_url(url):
             raise ValueError("Invalid SoundCloud URL")
         self.url = url
+        self.index = index
 
     @staticmethod
     def validate_url(url: str) -> bool:
-        return re.match(r'https?://soundcloud\.com/[\w-]+/[\w-]+', url) is not None
+        # Tracks of a set without a public permalink are listed by their API URL.
+        return re.match(r'https?://(soundcloud\.com/[\w-]+/[\w-]+|api-v2\.soundcloud\.com/tracks/\d+)', url) is not None
+
+    @staticmethod
+    def is_set_url(url: str) -> bool:
+        return re.match(r'https?://(www\.|m\.)?soundcloud\.com/[\w-]+/sets/[\w-]+', url) is not None
 
     async def download_and_convert(self):
-        output_path = f"music/{self.url.split('/')[-1]}"
-        if os.path.exists(output_path):
-            logging.error(f"File already cached: {output_path}")
-            return output_path
-        
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'outtmpl': output_path,
-        }
-        
+        page_url = canonical_page_url(self.url)
+        if self.index:
+            cached = self.index.resolve_alias("soundcloud", page_url)
+            if cached:
+                logging.error(f"File already cached: {cached['path']}")
+                return cached["path"]
+
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._download_sync, ydl_opts)
-            return f"{output_path}.mp3"
+            record = await ytdl_backend.download_track(self.url, "soundcloud")
         except Exception as e:
             logging.error(f"Error downloading SoundCloud audio: {e}")
             return None
+        checksum = None
+        if record["staged"]:
+            if not os.path.exists(record["staged"]):
+                logging.error(f"SoundCloud download produced no file for {self.url}")
+                return None
+            _, checksum = await asyncio.get_event_loop().run_in_executor(None, commit_download, record["staged"], record["path"])
+        if self.index:
+            track_id = str(record["id"])
+            # A file that was already there keeps its entry (and its loudness analysis).
+            if record["staged"] or not self.index.get("soundcloud", track_id):
+                self.index.record("soundcloud", track_id, record["path"], codec="mp3", bitrate=320, duration=record.get("duration"), checksum=checksum)
+            self.index.add_alias("soundcloud", page_url, track_id)
+        return record["path"]
 
-    def _download_sync(self, ydl_opts):
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(self.url, download=True)
-
-async def get_soundcloud_audio(url):
-    streamer = SoundCloudAudioStreamer(url)
+async def get_soundcloud_audio(url, index=None):
+    streamer = SoundCloudAudioStreamer(url, index)
     return await streamer.download_and_convert()
 
+async def get_soundcloud_tracklist(url):
+    """Flat-extracts a set in one request: (set title, [{"id", "title", "url"}, ...]) in set order."""
+    record = await ytdl_backend.extract("tracklist", url)
+    entries = [entry for entry in record.get("entries") or [] if entry.get("id") and entry.get("url")]
+    return record.get("title") or "SoundCloud set", entries
+
 async def get_soundcloud_title(url):
     try:
         headers = {"User-Agent": "Mozilla/5.0"}
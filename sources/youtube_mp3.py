@@ -1,15 +1,19 @@
 import asyncio
 import re
 import os
-import yt_dlp
+import subprocess
 import logging
 
+from utils.ytdl_backend import ytdl_backend
+from utils.download_manager import staged_path, commit_download
+
 class YouTubeAudioStreamer:
 
-    def __init__(self, video_id):
+    def __init__(self, video_id, index=None):
         if not self.validate_video_id(video_id):
             raise ValueError("Invalid YouTube video ID")
         self.video_id = video_id
+        self.index = index
         self.video_url = f'https://www.youtube.com/watch?v={video_id}'
         self.music_url = f'https://music.youtube.com/watch?v={video_id}'
 
@@ -17,55 +21,76 @@ class YouTubeAudioStreamer:
     def validate_video_id(video_id: str) -> bool:
         return re.match(r'^[a-zA-Z0-9_-]{11}$', video_id) is not None
 
-    async def download_and_convert(self):
+    async def download_and_convert(self, fallback=False):
         opus_file_path = f"music/{self.video_id}.opus"
         mp3_file_path = f"music/{self.video_id}.mp3"
 
-        if os.path.exists(opus_file_path):
-            logging.error(f"File already cached: {opus_file_path}")
-            return opus_file_path
-        if os.path.exists(mp3_file_path):
-            logging.error(f"File already cached: {mp3_file_path}")
-            return mp3_file_path
+        if self.index:
+            cached_path = self.index.path_for("youtube", self.video_id)
+            if cached_path:
+                logging.error(f"File already cached: {cached_path}")
+                return cached_path
+        else:
+            if os.path.exists(opus_file_path):
+                logging.error(f"File already cached: {opus_file_path}")
+                return opus_file_path
+            if os.path.exists(mp3_file_path):
+                logging.error(f"File already cached: {mp3_file_path}")
+                return mp3_file_path
+
+        # One extraction picks the format; native Opus is only remuxed out of
+        # WebM, anything else is transcoded to MP3. Errors (including
+        # PermanentDownloadError for removed/private videos) go to the caller,
+        # whose retry asks for the youtube.com page (fallback) instead.
+        record = await ytdl_backend.download_audio(self.video_url if fallback else self.music_url)
+        if record["codec"] == 'opus':
+            output_path, quality = opus_file_path, None
+        else:
+            output_path, quality = mp3_file_path, '320'
+        if not os.path.exists(record["staged"]):
+            raise RuntimeError("Error: Unable to download audio in any format")
+        loop = asyncio.get_event_loop()
+        _, checksum = await loop.run_in_executor(None, commit_download, record["staged"], output_path)
+        if self.index:
+            self.index.record("youtube", self.video_id, output_path, codec=record["codec"], bitrate=quality, duration=record.get("duration"), checksum=checksum)
+        return output_path
 
-        # Try downloading Opus 774 first from YouTube Music
-        if await self._attempt_download(self.music_url, 'opus', '774', opus_file_path):
-            return opus_file_path
-        
-        # Try downloading Opus 774 from regular YouTube
-        if await self._attempt_download(self.video_url, 'opus', '774', opus_file_path):
-            return opus_file_path
-        
-        # Fallback to MP3 if Opus 774 isn't available
-        if await self._attempt_download(self.video_url, 'mp3', '320', mp3_file_path):
-            return mp3_file_path
-        
-        raise RuntimeError("Error: Unable to download audio in any format")
+    async def download_progressive(self, partial_path, finished):
+        """
+        Downloads the raw audio stream straight into partial_path (no .part
+        file, no post-processing) so it can be played while it grows, sets
+        finished, then remuxes it into the staging area and commits it to
+        music/ like download_and_convert().
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            info = await ytdl_backend.extract("progressive-download", self.music_url, download=True, outtmpl=partial_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            finished.set()
 
-    async def _attempt_download(self, url, codec, quality, output_path):
-        ydl_opts = {
-            'format': 'bestaudio[acodec^=opus]/bestaudio',
-            'cookiefile': '/app/config/cookies.txt',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': codec,
-                'preferredquality': quality,
-            }],
-            'outtmpl': f'music/%(id)s',
-        }
-        
+        if ((info or {}).get('acodec') or '').startswith('opus'):
+            output_path, codec, quality, codec_args = f"music/{self.video_id}.opus", 'opus', None, ['-c:a', 'copy', '-f', 'opus']
+        else:
+            output_path, codec, quality, codec_args = f"music/{self.video_id}.mp3", 'mp3', '320', ['-c:a', 'libmp3lame', '-b:a', '320k', '-f', 'mp3']
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._download_sync, ydl_opts, url)
-            return os.path.exists(output_path)
-        except Exception as e:
-            logging.error(f"Error downloading {codec} format from {url}: {e}")
-            return False
+            _, checksum = await loop.run_in_executor(None, self._remux_sync, partial_path, output_path, codec_args)
+        finally:
+            os.remove(partial_path)
+        if self.index:
+            self.index.record("youtube", self.video_id, output_path, codec=codec, bitrate=quality, duration=(info or {}).get('duration'), checksum=checksum)
+        return output_path
 
-    def _download_sync(self, ydl_opts, url):
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=True)
+    @staticmethod
+    def _remux_sync(source_path, output_path, codec_args):
+        staged = staged_path(os.path.basename(output_path))
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", source_path, "-vn", *codec_args, staged], check=True)
+        return commit_download(staged, output_path)
 
-async def get_audio_filename(video_id):
-    streamer = YouTubeAudioStreamer(video_id)
-    return await streamer.download_and_convert()
+async def get_audio_filename(video_id, index=None, fallback=False):
+    streamer = YouTubeAudioStreamer(video_id, index)
+    return await streamer.download_and_convert(fallback)
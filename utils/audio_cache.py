@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+AUDIO_EXTENSIONS = (".opus", ".mp3", ".m4a", ".webm", ".ogg", ".flac", ".wav", ".aac")
+
+class AudioCacheManager:
+    """
+    Keeps the downloaded audio in music/ under a byte budget.
+
+    When the directory grows past max_bytes, a background sweep deletes the
+    least recently played files until it is back under low_watermark * max_bytes.
+    Play order comes from last_played(), a thread-safe callable returning
+    {absolute path: last play time} (the AudioIndex); files it does not know
+    fall back to their mtime. Files named by pinned() (queued or playing
+    track ids or paths) and files younger than min_age seconds (downloads
+    still being finalised) are never evicted; on_evict(path) is called for
+    every file removed. max_bytes <= 0 disables eviction.
+
+    pinned() reads the bot's live queues, so request_sweep() calls it on the
+    event loop and hands the executor job a frozen set.
+    """
+
+    def __init__(self, directory, max_bytes, pinned=None, last_played=None, executor=None, min_age=300, low_watermark=0.9, on_evict=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pinned = pinned
+        self.last_played = last_played
+        self.on_evict = on_evict
+        self.executor = executor
+        self.min_age = min_age
+        self.low_watermark = low_watermark
+        self.total_bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._sweep_lock = threading.Lock()
+        self._sweep_task = None
+
+    def request_sweep(self):
+        """Schedules a background sweep unless one is already running."""
+        if self.max_bytes <= 0:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.sweep()
+            return
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = loop.run_in_executor(self.executor, self.sweep, self._pinned_keys())
+            self._sweep_task.add_done_callback(self._sweep_done)
+
+    @staticmethod
+    def _sweep_done(task):
+        if not task.cancelled() and task.exception():
+            logging.error("AudioCache: sweep failed", exc_info=task.exception())
+
+    def _pinned_keys(self):
+        keys = set()
+        if self.pinned:
+            for key in self.pinned():
+                if key:
+                    keys.add(str(key))
+                    keys.add(os.path.abspath(str(key)))
+        return frozenset(keys)
+
+    def _scan(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.is_file() or not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def sweep(self, pinned=None):
+        """
+        Evicts least recently played files not in pinned (default: pinned(),
+        only safe on the event loop) until under budget. Returns bytes freed.
+        """
+        if self.max_bytes <= 0 or not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            entries = self._scan()
+            self.total_bytes = sum(size for _, size, _, _ in entries)
+            if self.total_bytes <= self.max_bytes:
+                return 0
+
+            target = self.max_bytes * self.low_watermark
+            if pinned is None:
+                pinned = self._pinned_keys()
+            played = self.last_played() if self.last_played else {}
+            cutoff = time.time() - self.min_age
+            freed = 0
+            entries.sort(key=lambda entry: played.get(os.path.abspath(entry[2])) or entry[0])
+            for mtime, size, path, name in entries:
+                if self.total_bytes - freed <= target:
+                    break
+                if mtime > cutoff:
+                    continue
+                stem = os.path.splitext(name)[0]
+                if stem in pinned or path in pinned or os.path.abspath(path) in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"AudioCache: could not evict {path}: {e}")
+                    continue
+                if self.on_evict:
+                    self.on_evict(path)
+                freed += size
+                self.evicted_files += 1
+                self.evicted_bytes += size
+                logging.info(f"AudioCache: evicted {name} ({size / (1024**2):.1f} MB)")
+
+            self.total_bytes -= freed
+            if self.total_bytes > self.max_bytes:
+                logging.warning(f"AudioCache: still {self.total_bytes / (1024**3):.2f} GB after eviction; the rest is pinned or too new.")
+            return freed
+        finally:
+            self._sweep_lock.release()
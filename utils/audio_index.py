@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+from utils.audio_cache import AUDIO_EXTENSIONS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio_files (
+    source TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    codec TEXT,
+    bitrate INTEGER,
+    duration REAL,
+    size INTEGER,
+    created REAL,
+    last_played REAL,
+    loudness REAL,
+    true_peak REAL,
+    checksum TEXT,
+    PRIMARY KEY (source, track_id)
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    source TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    PRIMARY KEY (source, alias)
+);
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+COLUMNS = ("source", "track_id", "path", "codec", "bitrate", "duration", "size", "created", "last_played", "loudness", "true_peak", "checksum")
+# Columns added after the first release, with their types, for databases created before them.
+ADDED_COLUMNS = (("loudness", "REAL"), ("true_peak", "REAL"), ("checksum", "TEXT"))
+YOUTUBE_ID = re.compile(r"^[a-zA-Z0-9_-]{11}$")
+# Bandcamp/SoundCloud downloads are named <source>-<track id>.
+SOURCE_PREFIXED = re.compile(r"^(bandcamp|soundcloud)-([\w-]+)$")
+
+class AudioIndex:
+    """
+    Persistent index of the downloaded audio in music/, keyed by (source, track id).
+
+    Rows live in a small SQLite file and are mirrored in memory, so "is this
+    cached and where" is a dict lookup instead of a round of os.path.exists
+    probes. Downloads call record() when they finish. The directory's mtime is
+    stored after every change made through the index; if it differs at startup
+    (files added or deleted by hand, or the database is new), the index is
+    reconciled against a directory scan.
+
+    Sources whose track id is only known after extraction (Bandcamp,
+    SoundCloud) also map their page URLs to it with add_alias(), so a repeat
+    request is answered by resolve_alias() without asking the site again.
+    """
+
+    def __init__(self, db_path, directory):
+        self.db_path = db_path
+        self.directory = directory
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(audio_files)")}
+        for column, kind in ADDED_COLUMNS:
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE audio_files ADD COLUMN {column} {kind}")
+        self._entries = {}
+        self._by_path = {}
+        self._by_id = {}
+        self._aliases = {(source, alias): track_id for source, alias, track_id in self._conn.execute("SELECT source, alias, track_id FROM aliases")}
+        for row in self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM audio_files"):
+            self._remember(dict(zip(COLUMNS, row)))
+        if self._stored_signature() != self._directory_signature():
+            self.rebuild()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, source, track_id):
+        with self._lock:
+            entry = self._entries.get((source, track_id))
+            return dict(entry) if entry else None
+
+    def path_for(self, source, track_id):
+        entry = self.get(source, track_id)
+        return entry["path"] if entry else None
+
+    def lookup(self, track_id):
+        """
+        Resolves a queue track id to its cache entry: a "|path" id or a file
+        name is looked up by path, anything else by id under any source.
+        """
+        track_id = str(track_id)
+        with self._lock:
+            for candidate in (track_id.lstrip("|"), os.path.join(self.directory, track_id)):
+                entry = self._by_path.get(self._path_key(candidate))
+                if entry:
+                    return dict(entry)
+            entry = self._by_id.get(track_id)
+            return dict(entry) if entry else None
+
+    def resolve_alias(self, source, alias):
+        """Cache entry for an alias recorded with add_alias(), or None if unknown or no longer cached."""
+        with self._lock:
+            track_id = self._aliases.get((source, alias))
+            entry = self._entries.get((source, track_id)) if track_id else None
+            return dict(entry) if entry else None
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def record(self, source, track_id, path, codec=None, bitrate=None, duration=None, checksum=None):
+        """Adds or replaces the entry for a finished download (checksum as returned by commit_download)."""
+        stat = os.stat(path)
+        codec = codec or os.path.splitext(path)[1].lstrip(".").lower() or None
+        with self._lock:
+            old = self._entries.get((source, track_id)) or self._by_path.get(self._path_key(path)) or {}
+            entry = {
+                "source": source,
+                "track_id": track_id,
+                "path": path,
+                "codec": codec,
+                "bitrate": int(bitrate) if bitrate else old.get("bitrate"),
+                "duration": duration if duration is not None else old.get("duration"),
+                "size": stat.st_size,
+                "created": old.get("created") or stat.st_mtime,
+                "last_played": old.get("last_played"),
+                # A new file needs a new loudness analysis.
+                "loudness": None,
+                "true_peak": None,
+                "checksum": checksum,
+            }
+            with self._transaction():
+                self._conn.execute("DELETE FROM audio_files WHERE path = ? OR (source = ? AND track_id = ?)", (path, source, track_id))
+                self._conn.execute(
+                    f"INSERT INTO audio_files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    tuple(entry[column] for column in COLUMNS)
+                )
+                self._store_signature()
+            self._forget(old)
+            self._remember(entry)
+        return dict(entry)
+
+    def add_alias(self, source, alias, track_id):
+        with self._lock:
+            if self._aliases.get((source, alias)) == track_id:
+                return
+            self._conn.execute("INSERT OR REPLACE INTO aliases (source, alias, track_id) VALUES (?, ?, ?)", (source, alias, track_id))
+            self._aliases[(source, alias)] = track_id
+
+    def update(self, path, **fields):
+        """Sets extra columns (duration, bitrate, ...) on an existing entry."""
+        fields = {k: v for k, v in fields.items() if k in COLUMNS and k not in ("source", "track_id", "path")}
+        with self._lock:
+            entry = self._by_path.get(self._path_key(path))
+            if not entry or not fields:
+                return
+            self._conn.execute(
+                f"UPDATE audio_files SET {', '.join(f'{k} = ?' for k in fields)} WHERE path = ?",
+                (*fields.values(), entry["path"])
+            )
+            entry.update(fields)
+
+    def touch(self, path):
+        self.update(path, last_played=time.time())
+
+    def remove_path(self, path):
+        with self._lock:
+            entry = self._by_path.get(self._path_key(path))
+            if not entry:
+                return
+            with self._transaction():
+                self._conn.execute("DELETE FROM audio_files WHERE path = ?", (entry["path"],))
+                self._store_signature()
+            self._forget(entry)
+
+    def rebuild(self):
+        """Reconciles the index with the files actually in the directory."""
+        started = time.monotonic()
+        found = {}
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.is_file() and item.name.lower().endswith(AUDIO_EXTENSIONS):
+                    found[self._path_key(item.path)] = (item.path, item.stat())
+
+        with self._lock:
+            added = removed = 0
+            with self._transaction():
+                for key, entry in list(self._by_path.items()):
+                    if key not in found:
+                        self._conn.execute("DELETE FROM audio_files WHERE path = ?", (entry["path"],))
+                        self._forget(entry)
+                        removed += 1
+                for key, (path, stat) in found.items():
+                    if key in self._by_path:
+                        continue
+                    stem, ext = os.path.splitext(os.path.basename(path))
+                    prefixed = SOURCE_PREFIXED.match(stem)
+                    if prefixed:
+                        source, stem = prefixed.groups()
+                    else:
+                        source = "youtube" if YOUTUBE_ID.match(stem) else "local"
+                    if (source, stem) in self._entries:
+                        source, stem = "local", os.path.basename(path)
+                    entry = {
+                        "source": source, "track_id": stem, "path": path, "codec": ext.lstrip(".").lower(),
+                        "bitrate": None, "duration": None, "size": stat.st_size,
+                        "created": stat.st_mtime, "last_played": None, "loudness": None, "true_peak": None, "checksum": None,
+                    }
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO audio_files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                        tuple(entry[column] for column in COLUMNS)
+                    )
+                    self._remember(entry)
+                    added += 1
+                self._store_signature()
+        logging.info(f"AudioIndex: rebuilt from {self.directory} in {time.monotonic() - started:.2f}s (+{added} / -{removed}, {len(self._entries)} files).")
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _path_key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _remember(self, entry):
+        self._entries[(entry["source"], entry["track_id"])] = entry
+        self._by_path[self._path_key(entry["path"])] = entry
+        self._by_id[entry["track_id"]] = entry
+
+    def _forget(self, entry):
+        if not entry:
+            return
+        if self._entries.get((entry["source"], entry["track_id"])) is entry:
+            del self._entries[(entry["source"], entry["track_id"])]
+        if self._by_path.get(self._path_key(entry["path"])) is entry:
+            del self._by_path[self._path_key(entry["path"])]
+        if self._by_id.get(entry["track_id"]) is entry:
+            del self._by_id[entry["track_id"]]
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        else:
+            self._conn.execute("COMMIT")
+
+    def _directory_signature(self):
+        try:
+            return str(os.stat(self.directory).st_mtime_ns)
+        except OSError:
+            return ""
+
+    def _stored_signature(self):
+        row = self._conn.execute("SELECT value FROM index_meta WHERE key = 'directory_signature'").fetchone()
+        return row[0] if row else None
+
+    def _store_signature(self):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('directory_signature', ?)",
+            (self._directory_signature(),)
+        )
@@ -0,0 +1,39 @@
+import re
+from collections import namedtuple
+
+BlacklistMatch = namedtuple("BlacklistMatch", ["kind", "rule"])
+
+def normalize_title(title):
+    return (title or "").lower().strip()
+
+class BlacklistMatcher:
+    """
+    Precompiled title filter.
+
+    Keywords are folded into one alternation regex (longest first), and exact
+    blacklisted titles and whitelisted titles are kept in sets, so a check is a
+    single regex scan plus two hash lookups. A whitelisted title overrides every
+    rule. Call rebuild() whenever the stored lists change.
+    """
+
+    def __init__(self, keywords, blacklist=(), whitelist=()):
+        self.keywords = sorted({normalize_title(k) for k in keywords if normalize_title(k)}, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(k) for k in self.keywords)) if self.keywords else None
+        self.rebuild(blacklist, whitelist)
+
+    def rebuild(self, blacklist, whitelist):
+        self._exact = {normalize_title(t) for t in blacklist}
+        self._whitelist = {normalize_title(t) for t in whitelist}
+
+    def match(self, title):
+        """Returns the BlacklistMatch that blocks title, or None if it is allowed."""
+        title = normalize_title(title)
+        if title in self._whitelist:
+            return None
+        if title in self._exact:
+            return BlacklistMatch("blacklist", title)
+        if self._pattern:
+            found = self._pattern.search(title)
+            if found:
+                return BlacklistMatch("keyword", found.group(0))
+        return None
@@ -0,0 +1,37 @@
+import os
+import json
+import tempfile
+from urllib.parse import urlsplit
+
+def atomic_write_json(path, data, indent=4):
+    """
+    Writes JSON to a temp file in the same directory and renames it over path,
+    so a crash mid-write leaves either the old or the new file, never a torn one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def canonical_page_url(url):
+    """
+    Reduces a track page URL to one spelling (https, bare host, no query,
+    fragment or trailing slash), so share links of the same page compare equal.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return f"https://{host}{parts.path.rstrip('/')}"
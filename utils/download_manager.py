@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import hashlib
+import logging
+
+STAGING_DIR = os.path.join("music", ".staging")
+# yt-dlp's in-progress files; kept in the staging area so the next download of the track resumes them.
+RESUMABLE_SUFFIXES = (".part", ".ytdl")
+# Leftovers of interrupted downloads or conversions written straight into music/ by older versions
+# (yt-dlp's x.webm.part / x.part-Frag1, its post-processor's x.temp.mp3, the remux's x.opus.tmp).
+PARTIAL_FILE = re.compile(r"\.(part|ytdl|tmp)$|\.part-frag\d+|\.temp\.\w+$", re.IGNORECASE)
+
+def staged_path(name):
+    return os.path.join(STAGING_DIR, name)
+
+def file_checksum(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def commit_download(staged, final_path):
+    """
+    Moves a finished download from the staging area to final_path: flushes
+    it to disk, checksums it and renames it into place, so music/ only ever
+    sees complete files. Returns (size, checksum). Blocking.
+    """
+    with open(staged, "rb") as f:
+        os.fsync(f.fileno())
+    checksum = file_checksum(staged)
+    size = os.path.getsize(staged)
+    os.replace(staged, final_path)
+    return size, checksum
+
+class DownloadManager:
+    """
+    Startup recovery for downloads cut off by a crash or !reboot.
+
+    Downloads are written to the staging area and only renamed into the
+    music directory once complete (commit_download), with the size and
+    checksum stored on their AudioIndex entry. sweep() clears what an
+    interrupted run left behind:
+
+    - yt-dlp .part files in the staging area younger than partial_max_age
+      are kept, since yt-dlp continues them with an HTTP range request the
+      next time the track is downloaded; older ones and any half-converted
+      output are deleted.
+    - partial files in the music directory itself (from before the staging
+      area) and the progressive playback directory are deleted.
+    - indexed files whose size no longer matches the index are truncated
+      copies and are dropped.
+
+    verify() additionally re-reads every file with a stored checksum.
+    """
+
+    def __init__(self, index, directory="music", staging_dir=STAGING_DIR, progressive_dir=None, partial_max_age=86400):
+        self.index = index
+        self.directory = directory
+        self.staging_dir = staging_dir
+        self.progressive_dir = progressive_dir
+        self.partial_max_age = partial_max_age
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def sweep(self):
+        started = time.monotonic()
+        now = time.time()
+        kept = removed = 0
+        for path in self._files(self.staging_dir):
+            if path.endswith(RESUMABLE_SUFFIXES) and now - os.path.getmtime(path) < self.partial_max_age:
+                kept += 1
+                continue
+            removed += self._delete(path)
+        for path in self._files(self.directory):
+            if PARTIAL_FILE.search(os.path.basename(path)):
+                removed += self._delete(path)
+        if self.progressive_dir:
+            for path in self._files(self.progressive_dir):
+                removed += self._delete(path)
+        for entry in self.index.entries():
+            try:
+                size = os.path.getsize(entry["path"])
+            except OSError:
+                size = None
+            if entry.get("size") is not None and size != entry["size"]:
+                logging.warning(f"DownloadManager: {entry['path']} is {size} bytes, expected {entry['size']}; dropping it.")
+                removed += self._delete(entry["path"])
+        logging.info(f"DownloadManager: startup sweep in {time.monotonic() - started:.2f}s ({removed} removed, {kept} resumable downloads kept).")
+        return removed
+
+    def verify(self):
+        """Re-checksums indexed files and drops the ones that changed on disk. Blocking; reads everything."""
+        corrupt = 0
+        for entry in self.index.entries():
+            if not entry.get("checksum"):
+                continue
+            try:
+                matches = file_checksum(entry["path"]) == entry["checksum"]
+            except OSError:
+                matches = False
+            if not matches:
+                logging.warning(f"DownloadManager: checksum mismatch for {entry['path']}; dropping it.")
+                corrupt += self._delete(entry["path"])
+        logging.info(f"DownloadManager: verified checksums, {corrupt} corrupt files removed.")
+        return corrupt
+
+    @staticmethod
+    def _files(directory):
+        try:
+            with os.scandir(directory) as it:
+                return [entry.path for entry in it if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def _delete(self, path):
+        self.index.remove_path(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"DownloadManager: could not remove {path}: {e}")
+            return 0
+        return 1
@@ -0,0 +1,146 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+PLAYBACK = 0
+PRELOAD = 1
+BULK = 2
+PRIORITY_NAMES = {PLAYBACK: "playback", PRELOAD: "preload", BULK: "bulk"}
+
+class DownloadScheduler:
+    """
+    Central admission control for yt-dlp / ffmpeg downloads.
+
+    Callers wrap a download in ``async with scheduler.slot(guild_id, priority)``.
+    At most max_concurrent downloads run at once, and at most per_guild for any
+    one guild. A free slot goes to the highest priority class that has a
+    runnable job (PLAYBACK, then PRELOAD, then BULK). Within a class, guilds are
+    served round-robin, so one guild's 300-track import cannot starve another
+    guild's next song.
+
+    A job given a key can be moved up a class while it waits with
+    escalate(key, priority), e.g. when playback starts waiting on a preload.
+    """
+
+    def __init__(self, max_concurrent=3, per_guild=2):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_guild = max(1, per_guild)
+        self._waiting = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self._active = {}
+        self._active_total = 0
+        self._keyed = {}
+        self._started = {priority: 0 for priority in PRIORITY_NAMES}
+        self._wait_total = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._wait_max = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    @asynccontextmanager
+    async def slot(self, guild_id, priority=PRELOAD, key=None):
+        await self._acquire(guild_id, priority, key)
+        try:
+            yield
+        finally:
+            self._release(guild_id)
+
+    async def run(self, guild_id, priority, func, *args, key=None):
+        """Awaits func(*args) while holding a download slot."""
+        async with self.slot(guild_id, priority, key):
+            return await func(*args)
+
+    def escalate(self, key, priority):
+        """Moves the waiting job for key into a higher class. Returns True if it was moved."""
+        waiting = self._keyed.get(key)
+        if waiting is None or waiting[1][2] <= priority:
+            return False
+        guild_id, job = waiting
+        self._forget(guild_id, job)
+        job[2] = priority
+        self._waiting[priority].setdefault(guild_id, deque()).append(job)
+        self._dispatch()
+        return True
+
+    async def _acquire(self, guild_id, priority, key=None):
+        future = asyncio.get_running_loop().create_future()
+        # [future, queued_at, priority]; a list so escalate() can change the class.
+        job = [future, time.monotonic(), priority]
+        self._waiting[priority].setdefault(guild_id, deque()).append(job)
+        if key is not None:
+            self._keyed[key] = (guild_id, job)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; hand it on.
+                self._release(guild_id)
+            else:
+                self._forget(guild_id, job)
+            raise
+        finally:
+            if key is not None and self._keyed.get(key, (None, None))[1] is job:
+                del self._keyed[key]
+
+    def _forget(self, guild_id, job):
+        jobs = self._waiting[job[2]].get(guild_id)
+        if not jobs:
+            return
+        for i, queued in enumerate(jobs):
+            if queued is job:
+                del jobs[i]
+                break
+        if not jobs:
+            del self._waiting[job[2]][guild_id]
+
+    def _release(self, guild_id):
+        self._active_total -= 1
+        self._active[guild_id] -= 1
+        if self._active[guild_id] <= 0:
+            del self._active[guild_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._active_total < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            guild_id, (future, queued_at, priority) = job
+            waited = time.monotonic() - queued_at
+            self._started[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+            self._active_total += 1
+            self._active[guild_id] = self._active.get(guild_id, 0) + 1
+            future.set_result(None)
+
+    def _next_job(self):
+        for priority in sorted(self._waiting):
+            guilds = self._waiting[priority]
+            for guild_id in list(guilds):
+                if self._active.get(guild_id, 0) >= self.per_guild:
+                    continue
+                jobs = guilds[guild_id]
+                while jobs and jobs[0][0].done():
+                    jobs.popleft()
+                if not jobs:
+                    del guilds[guild_id]
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    guilds.move_to_end(guild_id)
+                else:
+                    del guilds[guild_id]
+                return guild_id, job
+        return None
+
+    def stats(self):
+        """Returns queue depth, active jobs and wait times for !metrics."""
+        stats = {"active": self._active_total, "limit": self.max_concurrent, "per_guild": self.per_guild, "classes": {}}
+        for priority, name in PRIORITY_NAMES.items():
+            started = self._started[priority]
+            stats["classes"][name] = {
+                "queued": sum(len(jobs) for jobs in self._waiting[priority].values()),
+                "started": started,
+                "avg_wait": self._wait_total[priority] / started if started else 0.0,
+                "max_wait": self._wait_max[priority],
+            }
+        return stats
@@ -0,0 +1,52 @@
+import logging
+import threading
+import subprocess
+
+def probe_duration(path):
+    """Reads a file's duration in seconds from its container headers with ffprobe (no decoding). None if unknown."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=15
+        )
+        return float(result.stdout.strip())
+    except (ValueError, OSError, subprocess.SubprocessError) as e:
+        logging.error(f"Error getting duration of {path}: {e}")
+        return None
+
+class DurationService:
+    """
+    Track durations without decoding anything.
+
+    Indexed files keep their duration on the AudioIndex entry (filled from
+    yt-dlp at download time, or by the first probe); other files are probed
+    once and remembered in memory. cached() never runs ffprobe, so it is safe
+    on the event loop; get() may, so run it in an executor.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.probes = 0
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def cached(self, path):
+        entry = self.index.lookup(path)
+        if entry and entry.get("duration"):
+            return entry["duration"]
+        with self._lock:
+            return self._durations.get(path)
+
+    def get(self, path):
+        duration = self.cached(path)
+        if duration:
+            return duration
+        duration = probe_duration(path)
+        self.probes += 1
+        if duration:
+            if self.index.lookup(path):
+                self.index.update(path, duration=duration)
+            else:
+                with self._lock:
+                    self._durations[path] = duration
+        return duration
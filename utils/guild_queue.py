@@ -0,0 +1,192 @@
+import asyncio
+import random
+from collections import Counter, deque
+from itertools import islice
+
+class GuildQueue:
+    """
+    Per-guild play queue of [track_id, title] items.
+
+    Backed by a deque with a track id counter for O(1) membership checks and a
+    version number that changes on every mutation, so readers (the web panel,
+    the preloader) can detect changes without copying the queue. get() waits
+    for the next item like asyncio.Queue.get(). When a journal callable is
+    given, every mutation is reported to it as journal(guild_id, op, *args).
+    """
+
+    def __init__(self, guild_id=None, items=(), journal=None):
+        self.guild_id = guild_id
+        self.journal = journal
+        self.version = 0
+        self._items = deque(items)
+        self._ids = Counter(item[0] for item in self._items)
+        self._getters = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, track_id):
+        return self._ids[track_id] > 0
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def _changed(self, op, *args):
+        self.version += 1
+        if self.journal:
+            self.journal(self.guild_id, op, *args)
+
+    def _wakeup_getter(self):
+        while self._getters:
+            waiter = self._getters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    # ------------------------------------------------------------------
+    # Adding and taking items
+    # ------------------------------------------------------------------
+
+    def put_nowait(self, item):
+        self._items.append(item)
+        self._ids[item[0]] += 1
+        self._changed("p", item)
+        self._wakeup_getter()
+
+    async def put(self, item):
+        self.put_nowait(item)
+
+    def extend(self, items):
+        items = list(items)
+        if not items:
+            return
+        self._items.extend(items)
+        self._ids.update(item[0] for item in items)
+        self._changed("e", items)
+        self._wakeup_getter()
+
+    def get_nowait(self):
+        if not self._items:
+            raise asyncio.QueueEmpty
+        item = self._items.popleft()
+        self._forget(item)
+        self._changed("g")
+        return item
+
+    async def get(self):
+        while not self._items:
+            waiter = asyncio.get_running_loop().create_future()
+            self._getters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                waiter.cancel()
+                try:
+                    self._getters.remove(waiter)
+                except ValueError:
+                    pass
+                if self._items and not waiter.cancelled():
+                    self._wakeup_getter()
+                raise
+        return self.get_nowait()
+
+    # ------------------------------------------------------------------
+    # Editing
+    # ------------------------------------------------------------------
+
+    def _forget(self, item):
+        self._ids[item[0]] -= 1
+        if self._ids[item[0]] <= 0:
+            del self._ids[item[0]]
+
+    def remove(self, index):
+        """Removes and returns the item at a 0-based index."""
+        if index < 0:
+            raise IndexError("queue index out of range")
+        item = self._items[index]
+        del self._items[index]
+        self._forget(item)
+        self._changed("r", index)
+        return item
+
+    def remove_track(self, track_id, title=None):
+        """Removes every queued copy of track_id (only those titled title, if given). Returns the count."""
+        removed = 0
+        if track_id not in self:
+            return removed
+        for index in range(len(self._items) - 1, -1, -1):
+            item = self._items[index]
+            if item[0] == track_id and (title is None or item[1] == title):
+                self.remove(index)
+                removed += 1
+        return removed
+
+    def retitle(self, track_id, title, old_title=None):
+        """Sets the title of every queued copy of track_id (only those titled old_title, if given)."""
+        updated = 0
+        if track_id not in self:
+            return updated
+        for item in self._items:
+            if item[0] == track_id and (old_title is None or item[1] == old_title):
+                item[1] = title
+                updated += 1
+        if updated:
+            self._changed("t", track_id, title, old_title)
+        return updated
+
+    def move(self, from_index, to_index):
+        """Moves the item at from_index to to_index (both 0-based) and returns it."""
+        if from_index < 0 or to_index < 0:
+            raise IndexError("queue index out of range")
+        item = self._items[from_index]
+        del self._items[from_index]
+        self._items.insert(to_index, item)
+        self._changed("m", from_index, to_index)
+        return item
+
+    def shuffle(self):
+        random.shuffle(self._items)
+        self._changed("s", list(self._items))
+
+    def clear(self):
+        self._items.clear()
+        self._ids.clear()
+        self._changed("c")
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+
+    def page(self, page, page_size):
+        """
+        Returns only the items on a 1-based page, without copying the rest of
+        the queue. The web panel reads from its own thread; if the bot changes
+        the queue mid-read, the page is simply read again.
+        """
+        start = (page - 1) * page_size
+        while True:
+            try:
+                return list(islice(self._items, start, start + page_size))
+            except RuntimeError:
+                # "deque mutated during iteration"
+                continue
+
+    def track_ids(self):
+        """Distinct queued track ids, without copying the queue."""
+        return list(self._ids)
+
+    def page_count(self, page_size):
+        return (len(self._items) + page_size - 1) // page_size
+
+    def snapshot(self):
+        """Returns a copy of the whole queue (for saving it); use page() to show part of it."""
+        return list(self._items)
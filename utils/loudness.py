@@ -0,0 +1,82 @@
+import math
+import json
+import asyncio
+import logging
+import subprocess
+
+def measure_loudness(path):
+    """
+    Measures a file's integrated loudness (LUFS), true peak (dBTP) and
+    loudness range with ffmpeg's loudnorm filter (EBU R128). Blocking; it
+    decodes the whole file, so run it in an executor.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-vn", "-af", "loudnorm=print_format=json", "-f", "null", "-"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    )
+    # loudnorm prints its JSON block last on stderr.
+    report = json.loads(result.stderr[result.stderr.rindex("{"):result.stderr.rindex("}") + 1])
+    loudness = float(report["input_i"])
+    if not math.isfinite(loudness):
+        raise ValueError(f"{path} is silent")
+    return {"loudness": loudness, "true_peak": float(report["input_tp"]), "loudness_range": float(report["input_lra"])}
+
+def normalization_gain(loudness, true_peak, target, peak_ceiling=-1.0):
+    """dB to add so the track lands on target LUFS without its true peak going over peak_ceiling."""
+    if loudness is None:
+        return 0.0
+    gain = target - loudness
+    if true_peak is not None:
+        gain = min(gain, peak_ceiling - true_peak)
+    return gain
+
+class LoudnessAnalyzer:
+    """
+    Measures downloaded tracks in the background and stores the result on
+    their AudioIndex entry (loudness, true_peak).
+
+    request(path) returns immediately; the measurement runs in the executor,
+    at most `concurrency` at a time, so it never holds up playback. Tracks
+    that are played before their analysis finishes simply play without
+    normalisation that time. Files that cannot be measured are not retried
+    until restart.
+    """
+
+    def __init__(self, index, executor=None, concurrency=1):
+        self.index = index
+        self.executor = executor
+        self.concurrency = concurrency
+        self.analyzed = 0
+        self.failed = 0
+        self._pending = set()
+        self._failed = set()
+        self._semaphore = None
+
+    def request(self, path):
+        if not path or path in self._pending or path in self._failed:
+            return
+        entry = self.index.lookup(path)
+        if not entry or entry.get("loudness") is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._pending.add(path)
+        loop.create_task(self._analyze(loop, entry["path"], path))
+
+    async def _analyze(self, loop, path, requested_path):
+        try:
+            async with self._semaphore:
+                result = await loop.run_in_executor(self.executor, measure_loudness, path)
+            self.index.update(path, loudness=result["loudness"], true_peak=result["true_peak"])
+            self.analyzed += 1
+            logging.info(f"Loudness: {path} is {result['loudness']:.1f} LUFS, peak {result['true_peak']:.1f} dBTP")
+        except Exception as e:
+            self._failed.add(requested_path)
+            self.failed += 1
+            logging.warning(f"Loudness: could not analyse {path}: {e}")
+        finally:
+            self._pending.discard(requested_path)
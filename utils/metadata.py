@@ -2,36 +2,45 @@ import os
 import json
 import musicbrainzngs
 import ffmpeg
-import subprocess
-import logging
+
+from utils.common import atomic_write_json
+from utils.duration import probe_duration
 
 class MetadataManager:
-    def __init__(self, cache_dir, editors_file, useragent, version, contact):
+    def __init__(self, cache_dir, editors_file, useragent, version, contact, state_store=None):
         self.cache_dir = cache_dir
         self.editors_file = editors_file
+        self.state_store = state_store
         self.editor_ids = self.load_editors()
         musicbrainzngs.set_useragent(useragent, version, contact)
         os.makedirs(cache_dir, exist_ok=True)
 
     def load_editors(self):
+        if self.state_store:
+            return self.state_store.get_editors()
         if os.path.exists(self.editors_file):
             with open(self.editors_file, 'r') as f:
                 return json.load(f).get("editors", [])
         return []
 
     def save_editors(self):
-        with open(self.editors_file, 'w') as f:
-            json.dump({"editors": self.editor_ids}, f, indent=4)
+        atomic_write_json(self.editors_file, {"editors": self.editor_ids})
 
     def add_editor(self, user_id):
         if user_id not in self.editor_ids:
             self.editor_ids.append(user_id)
-            self.save_editors()
+            if self.state_store:
+                self.state_store.add_editor(user_id)
+            else:
+                self.save_editors()
 
     def remove_editor(self, user_id):
         if user_id in self.editor_ids:
             self.editor_ids.remove(user_id)
-            self.save_editors()
+            if self.state_store:
+                self.state_store.remove_editor(user_id)
+            else:
+                self.save_editors()
 
     def get_metadata_path(self, filename):
         return os.path.join(self.cache_dir, f"{filename}.json")
@@ -44,9 +53,7 @@ class MetadataManager:
         return None
 
     def save_metadata(self, filename, metadata):
-        metadata_path = self.get_metadata_path(filename)
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=4)
+        atomic_write_json(self.get_metadata_path(filename), metadata)
 
     def fetch_metadata(self, query):
         result = musicbrainzngs.search_recordings(query=query, limit=1)
@@ -72,17 +79,6 @@ class MetadataManager:
             self.save_metadata(filename, metadata)
 
     def ffmpeg_get_track_length(self, path):
-        try:
-            result = subprocess.run(
-                ["ffmpeg", "-i", path, "-f", "null", "-"],
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            duration_line = [line for line in result.stderr.split("\n") if "Duration" in line]
-            if duration_line:
-                time_str = duration_line[0].split(",")[0].split("Duration:")[1].strip()
-                h, m, s = map(float, time_str.split(":"))
-                return int(h * 3600 + m * 60 + s)
-        except Exception as e:
-            logging.error(f"Error getting duration: {e}")
-        return None
\ No newline at end of file
+        # Container headers only (ffprobe); decoding the file just for its length took seconds.
+        duration = probe_duration(path)
+        return int(duration) if duration else None
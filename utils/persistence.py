@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import logging
+
+class WriteBehind:
+    """
+    Write-behind persistence for small, frequently changing state.
+
+    schedule() records the latest write for a key and returns immediately; a
+    burst of changes to the same key (e.g. repeated !volume calls) collapses
+    into a single write. Pending writes are flushed once per interval in the
+    executor, optionally inside one batch context (a StateStore transaction).
+    """
+
+    def __init__(self, executor=None, interval=2.0, batch=None):
+        self.executor = executor
+        self.interval = interval
+        self.batch = batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_task = None
+
+    def schedule(self, key, func, *args):
+        with self._lock:
+            self._pending[key] = (func, args)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.flush_sync)
+
+    def flush_sync(self):
+        """Writes everything pending. Safe to call from shutdown paths."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                if self.batch:
+                    with self.batch():
+                        self._run(pending)
+                else:
+                    self._run(pending)
+            except Exception:
+                logging.exception(f"WriteBehind: flush of {len(pending)} writes failed, keeping them pending.")
+                with self._lock:
+                    for key, write in pending.items():
+                        self._pending.setdefault(key, write)
+                return 0
+
+            logging.debug(f"WriteBehind: flushed {len(pending)} writes.")
+            return len(pending)
+
+    @staticmethod
+    def _run(pending):
+        for func, args in pending.values():
+            func(*args)
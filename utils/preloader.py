@@ -0,0 +1,100 @@
+import logging
+import itertools
+
+class Preloader:
+    """
+    Fetches the next few queued tracks ahead of time, per guild.
+
+    plan(guild_id, track_ids) looks at the first `window` upcoming track ids
+    and starts what they need through a SingleFlight, so a preload and a
+    later play of the same track share one download. prepare(guild_id,
+    track_id) says what that is: None when the track is ready to play, else
+    (key, func, args) for the flight. Preloads that drop out of the window
+    (removed, cleared, shuffled away) are cancelled unless another guild
+    still wants them or someone is already waiting on the result.
+
+    track_started() counts whether the track about to play was ready (hit),
+    still being fetched (late) or never preloaded (miss).
+    """
+
+    def __init__(self, flights, prepare, window=3):
+        self.flights = flights
+        self.prepare = prepare
+        self.window = window
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+        self.started = 0
+        self.cancelled = 0
+        self._planned = {}
+        self._wanted = {}
+        self._tasks = {}
+
+    def is_active(self, guild_id):
+        return guild_id in self._planned
+
+    def keys(self):
+        return list(self._tasks)
+
+    def plan(self, guild_id, track_ids):
+        previous = self._planned.get(guild_id, set())
+        current = set()
+        for track_id in itertools.islice(track_ids, self.window):
+            plan = self.prepare(guild_id, track_id)
+            if plan is None:
+                continue
+            key, func, args = plan
+            current.add(key)
+            self._wanted.setdefault(key, set()).add(guild_id)
+            if key not in self._tasks:
+                task = self.flights.start(key, func, *args)
+                self._tasks[key] = task
+                self.started += 1
+                task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        self._planned[guild_id] = current
+        for key in previous - current:
+            self._release(guild_id, key)
+
+    def stop(self, guild_id):
+        """Cancels the guild's preloads and forgets it until its next plan()."""
+        self.plan(guild_id, ())
+        self._planned.pop(guild_id, None)
+
+    def track_started(self, guild_id, track_id):
+        plan = self.prepare(guild_id, track_id)
+        if plan is None:
+            self.hits += 1
+        elif plan[0] in self.flights:
+            self.late += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        played = self.hits + self.late + self.misses
+        return {
+            "hits": self.hits,
+            "late": self.late,
+            "misses": self.misses,
+            "hit_rate": self.hits / played if played else None,
+            "started": self.started,
+            "cancelled": self.cancelled,
+            "active": len(self._tasks),
+        }
+
+    def _release(self, guild_id, key):
+        guilds = self._wanted.get(key)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if guilds:
+                return
+            del self._wanted[key]
+        if key in self._tasks and self.flights.cancel(key):
+            self.cancelled += 1
+            logging.info(f"Preloader: cancelled {key}, it left the look-ahead window.")
+
+    def _finished(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        self._wanted.pop(key, None)
+        if not task.cancelled() and task.exception():
+            logging.warning(f"Preload of {key} failed: {task.exception()}")
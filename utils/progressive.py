@@ -0,0 +1,59 @@
+import os
+import time
+import asyncio
+
+class GrowingFileReader:
+    """
+    File-like reader over a file that a downloader is still appending to.
+
+    read() returns whatever bytes are available and, at the current end of the
+    file, waits for more until finished is set (then returns b"" like a normal
+    EOF). It is handed to FFmpegPCMAudio with pipe=True, whose writer thread
+    calls read() and feeds ffmpeg's stdin, so playback can start long before
+    the download completes. A download that stops growing for stall_timeout
+    seconds is treated as ended. Once closed (when the voice source is
+    cleaned up) read() returns b"" so the writer thread stops.
+    """
+
+    def __init__(self, path, finished, stall_timeout=30.0, poll_interval=0.05):
+        self.path = path
+        self.finished = finished
+        self.stall_timeout = stall_timeout
+        self.poll_interval = poll_interval
+        self._file = open(path, "rb")
+
+    def read(self, size=-1):
+        stalled_since = None
+        while True:
+            try:
+                data = self._file.read(size)
+            except ValueError:
+                # Closed by the voice source's cleanup.
+                return b""
+            if data:
+                return data
+            if self.finished.is_set():
+                # One last read: the writer may have appended after our previous attempt.
+                return self._file.read(size)
+            now = time.monotonic()
+            stalled_since = stalled_since or now
+            if now - stalled_since > self.stall_timeout:
+                return b""
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        self._file.close()
+
+async def wait_for_bytes(path, min_bytes, task, poll_interval=0.1):
+    """
+    Waits until path holds at least min_bytes or task finishes. Returns True
+    when enough data is there to start playing from the growing file.
+    """
+    while not task.done():
+        try:
+            if os.path.getsize(path) >= min_bytes:
+                return True
+        except OSError:
+            pass
+        await asyncio.sleep(poll_interval)
+    return False
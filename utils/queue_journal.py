@@ -0,0 +1,187 @@
+import os
+import json
+import functools
+import logging
+from collections import deque
+
+from utils.common import atomic_write_json
+
+class QueueJournal:
+    """
+    Append-only, per-guild journal of queue mutations.
+
+    Each mutation is one compact JSON line ``[seq, op, *args]`` appended to
+    ``<guild_id>.journal``. Every compact_every ops the current queue is written
+    to ``<guild_id>.snapshot.json`` (with the last seq it covers) and the journal
+    is truncated. Replay loads the snapshot and applies only newer ops, so a
+    crash between writing the snapshot and truncating the journal is harmless.
+
+    While the bot runs, compaction is split so the fsync'd snapshot write can
+    happen off the event loop: start_compaction() copies the queue and returns
+    the blocking write, ops recorded while it runs are kept, and
+    finish_compaction() then cuts the journal down to just those ops.
+
+    Ops: p=put, e=extend, g=pop for play, r=remove index, m=move,
+    s=replace all (shuffle), c=clear, t=retitle a track id.
+    """
+
+    def __init__(self, directory, compact_every=500):
+        self.directory = directory
+        self.compact_every = compact_every
+        self._guilds = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _journal_path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.journal")
+
+    def _snapshot_path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.snapshot.json")
+
+    def _state(self, guild_id, seq=0):
+        guild_id = int(guild_id)
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = {
+                "file": open(self._journal_path(guild_id), "a", encoding="utf-8"),
+                "seq": seq,
+                "ops": 0,
+                # Lines recorded since start_compaction(); None when no compaction is running.
+                "tail": None,
+            }
+            self._guilds[guild_id] = state
+        return state
+
+    def record(self, guild_id, op, *args):
+        """Appends one op. Returns True when the guild is due for compaction."""
+        state = self._state(guild_id)
+        state["seq"] += 1
+        state["ops"] += 1
+        line = json.dumps([state["seq"], op, *args], separators=(",", ":")) + "\n"
+        state["file"].write(line)
+        state["file"].flush()
+        if state["tail"] is not None:
+            state["tail"].append(line)
+        return state["ops"] >= self.compact_every
+
+    def compact(self, guild_id, items):
+        """Snapshots the current queue contents and truncates the journal."""
+        state = self._state(guild_id)
+        atomic_write_json(self._snapshot_path(guild_id), {"seq": state["seq"], "items": list(items)}, indent=None)
+        state["file"].close()
+        state["file"] = open(self._journal_path(guild_id), "w", encoding="utf-8")
+        state["ops"] = 0
+
+    def start_compaction(self, guild_id, items):
+        """
+        Begins compacting a guild's journal with a copy of its queue. Returns
+        the blocking snapshot write to run in an executor, or None if a
+        compaction is already running. Call finish_compaction() afterwards.
+        """
+        state = self._state(guild_id)
+        if state["tail"] is not None:
+            return None
+        state["tail"] = []
+        state["ops"] = 0
+        data = {"seq": state["seq"], "items": [list(item) for item in items]}
+        return functools.partial(atomic_write_json, self._snapshot_path(guild_id), data, indent=None)
+
+    def finish_compaction(self, guild_id, written):
+        """Replaces the journal with the ops recorded since start_compaction(), if the snapshot was written."""
+        state = self._state(guild_id)
+        tail, state["tail"] = state["tail"], None
+        if not written or tail is None:
+            return
+        journal_path = self._journal_path(guild_id)
+        with open(journal_path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(tail)
+        state["file"].close()
+        os.replace(journal_path + ".tmp", journal_path)
+        state["file"] = open(journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        for state in self._guilds.values():
+            state["file"].close()
+        self._guilds.clear()
+
+    def restore(self):
+        """Replays every guild's snapshot + journal. Returns {guild_id: [items]}."""
+        guild_ids = set()
+        for name in os.listdir(self.directory):
+            if name.endswith(".journal") or name.endswith(".snapshot.json"):
+                guild_ids.add(name.split(".", 1)[0])
+
+        queues = {}
+        for raw_id in guild_ids:
+            try:
+                guild_id = int(raw_id)
+            except ValueError:
+                continue
+            try:
+                items, seq, replayed = self._replay(guild_id)
+            except Exception:
+                logging.exception(f"QueueJournal: failed to replay queue for guild {guild_id}")
+                continue
+            self._state(guild_id, seq)
+            if replayed:
+                self.compact(guild_id, items)
+            if items:
+                queues[guild_id] = items
+        return queues
+
+    def _replay(self, guild_id):
+        items = deque()
+        snapshot_seq = 0
+        snapshot_path = self._snapshot_path(guild_id)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            items.extend(snapshot.get("items", []))
+            snapshot_seq = snapshot.get("seq", 0)
+
+        seq = snapshot_seq
+        replayed = 0
+        journal_path = self._journal_path(guild_id)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append.
+                        logging.warning(f"QueueJournal: skipping unreadable journal line for guild {guild_id}")
+                        continue
+                    if entry[0] <= snapshot_seq:
+                        continue
+                    items = self._apply(items, entry[1], entry[2:])
+                    seq = entry[0]
+                    replayed += 1
+        return list(items), seq, replayed
+
+    @staticmethod
+    def _apply(items, op, args):
+        try:
+            if op == "p":
+                items.append(args[0])
+            elif op == "e":
+                items.extend(args[0])
+            elif op == "g":
+                if items:
+                    items.popleft()
+            elif op == "r":
+                del items[args[0]]
+            elif op == "m":
+                track = items[args[0]]
+                del items[args[0]]
+                items.insert(args[1], track)
+            elif op == "s":
+                items = deque(args[0])
+            elif op == "c":
+                items.clear()
+            elif op == "t":
+                track_id, title, old_title = args
+                for item in items:
+                    if item[0] == track_id and (old_title is None or item[1] == old_title):
+                        item[1] = title
+        except IndexError:
+            logging.warning(f"QueueJournal: ignoring out of range '{op}' op during replay")
+        return items
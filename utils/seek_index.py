@@ -0,0 +1,247 @@
+import os
+import json
+import mmap
+import bisect
+import asyncio
+import logging
+import struct
+import threading
+from collections import OrderedDict
+
+from utils.common import atomic_write_json
+
+SIDECAR_VERSION = 1
+
+MP3_BITRATES = {
+    "mpeg1": (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    "mpeg2": (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def _index_ogg(data, interval):
+    """(header_end, points) for an Ogg Opus file; points start on pages that begin a fresh packet."""
+    points = []
+    pos = 0
+    pre_skip = 0
+    header_end = None
+    previous_granule = 0
+    next_time = 0.0
+    while pos + 27 <= len(data):
+        if data[pos:pos + 4] != b"OggS":
+            pos = data.find(b"OggS", pos + 1)
+            if pos < 0:
+                break
+            continue
+        header_type = data[pos + 5]
+        granule = struct.unpack_from("<q", data, pos + 6)[0]
+        segments = data[pos + 26]
+        body = pos + 27 + segments
+        page_end = body + sum(data[pos + 27:body])
+        if pos == 0 and data[body:body + 8] == b"OpusHead":
+            pre_skip = struct.unpack_from("<H", data, body + 10)[0]
+        if granule > 0:
+            if header_end is None:
+                header_end = pos
+            start = max(previous_granule - pre_skip, 0) / 48000
+            if not header_type & 0x01 and start >= next_time:
+                points.append((round(start, 3), pos))
+                next_time = start + interval
+            previous_granule = granule
+        pos = page_end
+    if header_end is None:
+        raise ValueError("no Ogg audio pages found")
+    return header_end, points
+
+def _index_mp3(data, interval):
+    """Frame-accurate points for an MP3 file, walking the frame headers (handles VBR without a TOC)."""
+    points = []
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    elapsed = 0.0
+    next_time = 0.0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        version = (b1 >> 3) & 3
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or ((b1 >> 1) & 3) != 1:
+            pos = data.find(b"\xff", pos + 1)
+            if pos < 0:
+                break
+            continue
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1
+            continue
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES["mpeg1" if mpeg1 else "mpeg2"][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+        frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+        if elapsed >= next_time:
+            points.append((round(elapsed, 3), pos))
+            next_time = elapsed + interval
+        elapsed += (1152 if mpeg1 else 576) / sample_rate
+        pos += frame_length
+    if not points:
+        raise ValueError("no MP3 frames found")
+    return 0, points
+
+def build_seek_index(path, interval=1.0):
+    """Scans an .opus (Ogg) or .mp3 file and returns its seek index as a dict. Blocking."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (".opus", ".ogg", ".mp3"):
+        raise ValueError(f"no seek index for {ext} files")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if ext == ".mp3":
+            header_end, points = _index_mp3(data, interval)
+        else:
+            header_end, points = _index_ogg(data, interval)
+    return {
+        "version": SIDECAR_VERSION,
+        "format": "mp3" if ext == ".mp3" else "ogg",
+        "size": os.path.getsize(path),
+        "header_end": header_end,
+        "points": points,
+    }
+
+class OffsetFileReader:
+    """File-like reader that yields prefix and then the file from offset; piped into ffmpeg by the voice source."""
+
+    def __init__(self, path, offset, prefix=b""):
+        self._prefix = prefix
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+
+    def read(self, size=-1):
+        if self._prefix:
+            data, self._prefix = (self._prefix, b"") if size < 0 or size >= len(self._prefix) else (self._prefix[:size], self._prefix[size:])
+            return data
+        try:
+            return self._file.read(size)
+        except ValueError:
+            # Closed by the voice source's cleanup.
+            return b""
+
+    def close(self):
+        self._file.close()
+
+class SeekIndex:
+    """Timestamp -> byte offset points for one file (at most `interval` seconds apart)."""
+
+    def __init__(self, data):
+        self.format = data["format"]
+        self.size = data["size"]
+        self.header_end = data["header_end"]
+        self.points = data["points"]
+        self._times = [point[0] for point in self.points]
+
+    def locate(self, seconds):
+        """(time, offset) of the last point at or before seconds."""
+        i = max(bisect.bisect_right(self._times, seconds) - 1, 0)
+        return tuple(self.points[i])
+
+    def open(self, path, seconds):
+        """
+        Returns (reader, residual): a reader positioned at the point just
+        before seconds and the remaining seconds to skip after it. For Ogg
+        the file's header pages are sent first so the stream still decodes.
+        """
+        point_time, offset = self.locate(seconds)
+        prefix = b""
+        if self.format == "ogg":
+            with open(path, "rb") as f:
+                prefix = f.read(self.header_end)
+        return OffsetFileReader(path, offset, prefix), max(seconds - point_time, 0)
+
+class SeekIndexStore:
+    """
+    Seek indexes for the cached audio, kept as small JSON sidecars in
+    directory (one per audio file, named after it).
+
+    request(path) builds a missing index in the background after a
+    download; get(path) returns it (None until built, or if the file has
+    changed since), keeping the most recently used ones in memory. Used by
+    playback for !seek and for resuming at a position. build() and remove()
+    also run in worker threads, so the in-memory entries are locked.
+    """
+
+    def __init__(self, directory, executor=None, interval=1.0, memory_entries=64):
+        self.directory = directory
+        self.executor = executor
+        self.interval = interval
+        self.memory_entries = memory_entries
+        self.built = 0
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._pending = set()
+        self._failed = set()
+
+    def sidecar_path(self, path):
+        return os.path.join(self.directory, f"{os.path.basename(path)}.json")
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        with self._memory_lock:
+            index = self._memory.get(key)
+        if index is None:
+            try:
+                with open(self.sidecar_path(path), "r") as f:
+                    data = json.load(f)
+                if data.get("version") != SIDECAR_VERSION:
+                    return None
+                index = SeekIndex(data)
+            except (OSError, ValueError, KeyError):
+                return None
+        try:
+            if os.path.getsize(path) != index.size:
+                self._forget(path)
+                return None
+        except OSError:
+            return None
+        with self._memory_lock:
+            self._memory[key] = index
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        return index
+
+    def _forget(self, path):
+        with self._memory_lock:
+            self._memory.pop(os.path.abspath(path), None)
+
+    def build(self, path):
+        """Builds and saves the sidecar for path. Blocking."""
+        data = build_seek_index(path, self.interval)
+        atomic_write_json(self.sidecar_path(path), data, indent=None)
+        self._forget(path)
+        self.built += 1
+        return data
+
+    def request(self, path):
+        if not path or not path.lower().endswith((".opus", ".ogg", ".mp3")) or path in self._pending or path in self._failed:
+            return
+        if self.get(path) is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._pending.add(path)
+        loop.create_task(self._build(loop, path))
+
+    async def _build(self, loop, path):
+        try:
+            data = await loop.run_in_executor(self.executor, self.build, path)
+            logging.info(f"SeekIndex: {path} indexed with {len(data['points'])} points.")
+        except Exception as e:
+            self._failed.add(path)
+            logging.warning(f"SeekIndex: could not index {path}: {e}")
+        finally:
+            self._pending.discard(path)
+
+    def remove(self, path):
+        self._forget(path)
+        try:
+            os.remove(self.sidecar_path(path))
+        except OSError:
+            pass
@@ -0,0 +1,44 @@
+import os
+import json
+import time
+import logging
+
+from utils.common import atomic_write_json
+
+class SessionSnapshot:
+    """
+    Persists per-guild playback sessions across a restart.
+
+    save() is called right before !reboot / !dockboot / !shutdown, and
+    take() is called once from on_ready. take() removes the file so a session
+    is resumed at most once, and ignores snapshots older than max_age seconds.
+    """
+
+    def __init__(self, path, max_age=600):
+        self.path = path
+        self.max_age = max_age
+
+    def save(self, sessions):
+        atomic_write_json(self.path, {"saved_at": time.time(), "sessions": sessions})
+        logging.info(f"SessionSnapshot: saved {len(sessions)} playback sessions.")
+
+    def take(self):
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"SessionSnapshot: unreadable snapshot {self.path}: {e}")
+            data = {}
+        finally:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+        age = time.time() - data.get("saved_at", 0)
+        if age > self.max_age:
+            logging.warning(f"SessionSnapshot: ignoring snapshot that is {int(age)}s old.")
+            return []
+        return data.get("sessions", [])
@@ -0,0 +1,63 @@
+import asyncio
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts func(*args); everyone who asks for the
+    same key while it runs awaits that task and gets its result or its
+    exception. Waiters are shielded, so one cancelled waiter does not cancel
+    the shared work. The entry is dropped as soon as the task finishes, so a
+    later call starts fresh (and a failed download can be retried). Work
+    started with start() and not awaited through do() (a preload) can be
+    called off with cancel().
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+        self.started = 0
+        self.joined = 0
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def keys(self):
+        return list(self._inflight)
+
+    def start(self, key, func, *args):
+        """Returns the in-flight task for key, starting func(*args) if there is none."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        else:
+            self.joined += 1
+        return task
+
+    async def do(self, key, func, *args):
+        task = self.start(key, func, *args)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def cancel(self, key):
+        """Cancels the in-flight task for key unless a do() caller is waiting for it. Returns True if cancelled."""
+        task = self._inflight.get(key)
+        if task is None or self._waiters.get(key):
+            return False
+        task.cancel()
+        return True
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved; every waiter has already seen it.
+            task.exception()
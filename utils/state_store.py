@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guild_config (
+    guild_id INTEGER PRIMARY KEY,
+    prefix TEXT NOT NULL DEFAULT '!',
+    dj_role INTEGER,
+    channel INTEGER,
+    autoplay INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS guild_volume (
+    guild_id INTEGER PRIMARY KEY,
+    volume INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS banned_users (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS title_filter (
+    kind TEXT NOT NULL CHECK (kind IN ('blacklist', 'whitelist')),
+    title TEXT NOT NULL,
+    PRIMARY KEY (kind, title)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metadata_editors (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS track_plays (
+    track_id TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0,
+    last_played REAL
+);
+"""
+
+# Columns added after the first release; applied once each and recorded in migrations.
+SCHEMA_MIGRATIONS = [
+    ("guild_config_stream_mode", "ALTER TABLE guild_config ADD COLUMN stream_mode TEXT"),
+    ("guild_config_normalize", "ALTER TABLE guild_config ADD COLUMN normalize INTEGER"),
+]
+
+GUILD_CONFIG_DEFAULTS = {"prefix": "!", "dj_role": None, "channel": None, "autoplay": False, "stream_mode": None, "normalize": None}
+
+class StateStore:
+    """
+    Single SQLite (WAL) store for guild and global bot state.
+
+    Every write is a small transactional upsert instead of a full-file rewrite.
+    Guild config is additionally cached in memory for get_prefix/check_perms;
+    the cache is dropped whenever PRAGMA data_version shows another connection
+    (e.g. the sqlite3 CLI) changed the database.
+    """
+
+    def __init__(self, db_path, check_interval=1.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._guild_cache = {}
+        self._tx_depth = 0
+        self._apply_schema_migrations()
+        self._data_version = self._read_data_version()
+        self._last_check = time.monotonic()
+
+    @contextmanager
+    def transaction(self):
+        """Opens a write transaction. Nested calls join the outermost one."""
+        with self._lock:
+            if self._tx_depth:
+                self._tx_depth += 1
+                try:
+                    yield self._conn
+                finally:
+                    self._tx_depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth = 1
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._tx_depth = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _apply_schema_migrations(self):
+        with self.transaction() as conn:
+            applied = {row[0] for row in conn.execute("SELECT name FROM migrations")}
+            for name, statement in SCHEMA_MIGRATIONS:
+                if name in applied:
+                    continue
+                conn.execute(statement)
+                conn.execute("INSERT INTO migrations (name, applied_at) VALUES (?, ?)", (name, time.time()))
+                logging.info(f"StateStore: applied schema migration {name}")
+
+    # ------------------------------------------------------------------
+    # Guild config
+    # ------------------------------------------------------------------
+
+    def _read_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh_guild_cache(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            version = self._read_data_version()
+            if version != self._data_version:
+                logging.info("StateStore: database changed externally, dropping guild config cache.")
+                self._data_version = version
+                self._guild_cache.clear()
+
+    def get_guild_config(self, guild_id):
+        """Returns the config dict for a guild. Callers must treat it as read-only."""
+        self._refresh_guild_cache()
+        guild_id = int(guild_id)
+        config = self._guild_cache.get(guild_id)
+        if config is not None:
+            return config
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prefix, dj_role, channel, autoplay, stream_mode, normalize FROM guild_config WHERE guild_id = ?",
+                (guild_id,)
+            ).fetchone()
+        if row:
+            config = {"prefix": row[0], "dj_role": row[1], "channel": row[2], "autoplay": bool(row[3]), "stream_mode": row[4],
+                      "normalize": None if row[5] is None else bool(row[5])}
+        else:
+            config = dict(GUILD_CONFIG_DEFAULTS)
+        self._guild_cache[guild_id] = config
+        return config
+
+    def stage_guild_config(self, guild_id, key, value):
+        """Applies a change to the in-memory view only; pair with a later update_guild_config."""
+        if key not in GUILD_CONFIG_DEFAULTS:
+            raise KeyError(f"Unknown guild config key: {key}")
+        config = dict(self.get_guild_config(guild_id))
+        config[key] = value
+        self._guild_cache[int(guild_id)] = config
+
+    def update_guild_config(self, guild_id, key, value, refresh_cache=True):
+        """
+        Writes a guild config value. Deferred writes of staged changes pass
+        refresh_cache=False so a newer staged value is not thrown away.
+        """
+        if key not in GUILD_CONFIG_DEFAULTS:
+            raise KeyError(f"Unknown guild config key: {key}")
+        guild_id = int(guild_id)
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO guild_config (guild_id) VALUES (?)", (guild_id,))
+            conn.execute(f"UPDATE guild_config SET {key} = ? WHERE guild_id = ?", (value, guild_id))
+        if refresh_cache:
+            self._guild_cache.pop(guild_id, None)
+
+    # ------------------------------------------------------------------
+    # Volume
+    # ------------------------------------------------------------------
+
+    def get_volumes(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT guild_id, volume FROM guild_volume").fetchall()
+        return {guild_id: volume for guild_id, volume in rows}
+
+    def set_volume(self, guild_id, volume):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO guild_volume (guild_id, volume) VALUES (?, ?) "
+                "ON CONFLICT(guild_id) DO UPDATE SET volume = excluded.volume",
+                (int(guild_id), int(volume))
+            )
+
+    # ------------------------------------------------------------------
+    # Banned users
+    # ------------------------------------------------------------------
+
+    def get_banned_users(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, name FROM banned_users").fetchall()
+        return {user_id: name for user_id, name in rows}
+
+    def ban_user(self, user_id, name):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO banned_users (user_id, name) VALUES (?, ?)", (int(user_id), name))
+
+    def unban_user(self, user_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM banned_users WHERE user_id = ?", (int(user_id),))
+
+    # ------------------------------------------------------------------
+    # Blacklist / whitelist
+    # ------------------------------------------------------------------
+
+    def get_title_filters(self):
+        data = {"blacklist": [], "whitelist": []}
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, title FROM title_filter ORDER BY rowid").fetchall()
+        for kind, title in rows:
+            data[kind].append(title)
+        return data
+
+    def add_title_filter(self, kind, title):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO title_filter (kind, title) VALUES (?, ?)", (kind, title))
+
+    def remove_title_filter(self, kind, title):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM title_filter WHERE kind = ? AND title = ?", (kind, title))
+
+    # ------------------------------------------------------------------
+    # Global settings (stats display, debug mode, ...)
+    # ------------------------------------------------------------------
+
+    def get_setting(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value))
+            )
+
+    # ------------------------------------------------------------------
+    # Track play counts (stream-or-cache policy)
+    # ------------------------------------------------------------------
+
+    def get_play_counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT track_id, plays FROM track_plays").fetchall()
+        return {track_id: plays for track_id, plays in rows}
+
+    def get_play_count(self, track_id):
+        with self._lock:
+            row = self._conn.execute("SELECT plays FROM track_plays WHERE track_id = ?", (track_id,)).fetchone()
+        return row[0] if row else 0
+
+    def record_play(self, track_id):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO track_plays (track_id, plays, last_played) VALUES (?, 1, ?) "
+                "ON CONFLICT(track_id) DO UPDATE SET plays = plays + 1, last_played = excluded.last_played",
+                (track_id, time.time())
+            )
+
+    # ------------------------------------------------------------------
+    # Metadata editors
+    # ------------------------------------------------------------------
+
+    def get_editors(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id FROM metadata_editors ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def add_editor(self, user_id):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO metadata_editors (user_id) VALUES (?)", (int(user_id),))
+
+    def remove_editor(self, user_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM metadata_editors WHERE user_id = ?", (int(user_id),))
+
+    # ------------------------------------------------------------------
+    # One-time import of the legacy JSON files
+    # ------------------------------------------------------------------
+
+    def migrate_json_files(self, paths):
+        """
+        Imports the legacy JSON config files in a single transaction.
+        paths maps a file kind ("server_config", "volume", "banned", "stats",
+        "blackwhitelist", "debug", "editors") to its path. Imported files are
+        renamed to <name>.migrated so the originals are kept as a backup.
+        """
+        name = "import_json_v1"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                return False
+
+        loaded = {}
+        for kind, path in paths.items():
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r") as f:
+                    loaded[kind] = (path, json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"StateStore: skipping unreadable {path} during migration: {e}")
+
+        with self.transaction() as conn:
+            for guild_id, config in (loaded.get("server_config", (None, {}))[1] or {}).items():
+                merged = {**GUILD_CONFIG_DEFAULTS, **config}
+                conn.execute(
+                    "INSERT OR REPLACE INTO guild_config (guild_id, prefix, dj_role, channel, autoplay) VALUES (?, ?, ?, ?, ?)",
+                    (int(guild_id), merged["prefix"], merged["dj_role"], merged["channel"], int(bool(merged["autoplay"])))
+                )
+            for guild_id, volume in (loaded.get("volume", (None, {}))[1] or {}).items():
+                conn.execute("INSERT OR REPLACE INTO guild_volume (guild_id, volume) VALUES (?, ?)", (int(guild_id), int(volume)))
+            for user_id, user_name in (loaded.get("banned", (None, {}))[1] or {}).items():
+                conn.execute("INSERT OR REPLACE INTO banned_users (user_id, name) VALUES (?, ?)", (int(user_id), user_name))
+            filters = loaded.get("blackwhitelist", (None, {}))[1] or {}
+            for kind in ("blacklist", "whitelist"):
+                for title in filters.get(kind, []):
+                    conn.execute("INSERT OR IGNORE INTO title_filter (kind, title) VALUES (?, ?)", (kind, title))
+            for kind in ("stats", "debug"):
+                for key, value in (loaded.get(kind, (None, {}))[1] or {}).items():
+                    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            for user_id in (loaded.get("editors", (None, {}))[1] or {}).get("editors", []):
+                conn.execute("INSERT OR IGNORE INTO metadata_editors (user_id) VALUES (?)", (int(user_id),))
+            conn.execute("INSERT INTO migrations (name, applied_at) VALUES (?, ?)", (name, time.time()))
+
+        for path, _ in loaded.values():
+            try:
+                os.replace(path, f"{path}.migrated")
+            except OSError as e:
+                logging.error(f"StateStore: could not rename migrated file {path}: {e}")
+        logging.info(f"StateStore: imported {', '.join(loaded) or 'no'} legacy config files.")
+        self._guild_cache.clear()
+        return True
@@ -0,0 +1,68 @@
+import time
+import threading
+from urllib.parse import urlparse, parse_qs
+
+from utils.ytdl_backend import ytdl_backend
+
+class StreamResolver:
+    """
+    Resolves direct media URLs with yt-dlp (download=False) for playing a
+    track straight from the source instead of writing it to music/.
+
+    Resolved URLs are cached until shortly before they expire. YouTube puts
+    the expiry in the URL's expire= parameter; URLs without one are kept for
+    default_ttl seconds. invalidate() drops an entry early, e.g. after the
+    server answered 403 halfway through a track.
+    """
+
+    def __init__(self, profile="stream", default_ttl=3600, expiry_margin=300):
+        self.profile = profile
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.resolved = 0
+        self.hits = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached URL for key, or None if there is none or it is about to expire."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] - self.expiry_margin <= time.time():
+                del self._cache[key]
+                return None
+            self.hits += 1
+            return entry["url"]
+
+    def duration(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            return entry["duration"] if entry else None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    async def resolve(self, key, page_url):
+        """Resolves page_url with yt-dlp and caches the result under key."""
+        info = await ytdl_backend.extract(self.profile, page_url)
+        url = (info or {}).get("url")
+        if not url:
+            raise ValueError(f"No stream URL found for {page_url}")
+
+        entry = {"url": url, "duration": info.get("duration"), "expires": self._expiry(url)}
+        with self._lock:
+            self._cache[key] = entry
+            self.resolved += 1
+        return url
+
+    def _expiry(self, url):
+        expire = parse_qs(urlparse(url).query).get("expire")
+        if expire:
+            try:
+                return float(expire[0])
+            except ValueError:
+                pass
+        return time.time() + self.default_ttl
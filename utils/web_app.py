@@ -16,8 +16,6 @@ from xml.etree.ElementTree import Element, tostring
 from authlib.integrations.starlette_client import OAuth
 from dotenv import load_dotenv
 
-from utils.metadata import MetadataManager
-
 load_dotenv()
 
 app = FastAPI()
@@ -43,22 +41,16 @@ albumart_dir = "/app/albumart"
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 app.mount("/albumart", StaticFiles(directory=albumart_dir), name="albumart")
 
-MUSICBRAINZ_USERAGENT = os.getenv("MUSICBRAINZ_USERAGENT", "default_user")
-MUSICBRAINZ_VERSION = os.getenv("MUSICBRAINZ_VERSION", "1.0")
-MUSICBRAINZ_CONTACT = os.getenv("MUSICBRAINZ_CONTACT", "default@example.com")
-
-metadata_manager = MetadataManager(
-    "./metacache",
-    "./config/metadataeditors.json",
-    MUSICBRAINZ_USERAGENT,
-    MUSICBRAINZ_VERSION,
-    MUSICBRAINZ_CONTACT
-)
-
-# These dicts are populated from the bot process
+# These are populated from the bot process
 server_queues = {}
 now_playing = {}
 track_history = {}
+audio_index = None
+# The bot's MetadataManager, so editors and cached metadata come from the same StateStore.
+metadata_manager = None
+
+# Upcoming tracks shown per page; the queues are read a page at a time, never copied whole.
+QUEUE_PAGE_SIZE = 50
 
 oauth = OAuth()
 
@@ -129,6 +121,21 @@ app.add_middleware(SecurityHeadersMiddleware)
 # Helper: normalize guild id lookups (bot stores ints, OAuth returns strings)
 # ---------------------------------------------------------------------------
 
+def queue_page(queue, page):
+    """(items, page, pages) for one page of a GuildQueue, with page clamped to the pages it has."""
+    pages = max(1, queue.page_count(QUEUE_PAGE_SIZE))
+    page = max(1, min(page, pages))
+    return queue.page(page, QUEUE_PAGE_SIZE), page, pages
+
+def queue_data(queue, page):
+    items, page, pages = queue_page(queue, page)
+    return {
+        "queue": [{"track_id": item[0], "title": item[1]} for item in items],
+        "page": page,
+        "pages": pages,
+        "total": len(queue),
+    }
+
 def resolve_guild_key(gid):
     """Return the actual key present in dicts for a provided guild id (string)."""
     if gid in server_queues:
@@ -277,7 +284,7 @@ def convert_data(data, fmt):
     else:
         return JSONResponse(content=data)
 
-def render_queue_html(guild_id, request):
+def render_queue_html(guild_id, request, page=1):
     key = resolve_guild_key(guild_id)
     if key is None:
         return f"<h1>No queue found for Guild ID: {guild_id}</h1>"
@@ -330,7 +337,8 @@ def render_queue_html(guild_id, request):
       </tr>
     """
     can_download = user_in_guild(request, str(guild_id))
-    for index, item in enumerate(queue._queue, start=1):
+    items, page, pages = queue_page(queue, page)
+    for index, item in enumerate(items, start=(page - 1) * QUEUE_PAGE_SIZE + 1):
         track_id = html.escape(str(item[0]))
         title = html.escape(str(item[1]))
         download_link = f'<a href="/download/{guild_id}/{track_id}">[Download]</a>' if can_download else ''
@@ -342,6 +350,11 @@ def render_queue_html(guild_id, request):
         </tr>
         """
     html_content += "</table>"
+    html_content += f"<p>{len(queue)} tracks. Page {page} of {pages}.</p>"
+    if page > 1:
+        html_content += f'<a href="/queue?guild_id={html.escape(str(guild_id))}&page={page-1}">Previous</a> '
+    if page < pages:
+        html_content += f'<a href="/queue?guild_id={html.escape(str(guild_id))}&page={page+1}">Next</a>'
     
     if key in track_history:
         history = track_history[key]
@@ -428,7 +441,8 @@ def render_queues_html():
             else:
                 html_content += f'<img src="/albumart/default.jpg" alt="Default Album Art">'
         html_content += "<h3>Upcoming Tracks:</h3><table><tr><th>#</th><th>Track ID</th><th>Title</th></tr>"
-        for index, item in enumerate(queue._queue, start=1):
+        items, _, pages = queue_page(queue, 1)
+        for index, item in enumerate(items, start=1):
             track_id = html.escape(str(item[0]))
             title = html.escape(str(item[1]))
             html_content += f"""
@@ -439,6 +453,8 @@ def render_queues_html():
             </tr>
             """
         html_content += "</table>"
+        if pages > 1:
+            html_content += f'<p><a href="/queue?guild_id={gid_display}&page=2">{len(queue) - len(items)} more tracks...</a></p>'
         if guild_id in track_history:
             history = track_history[guild_id]
             html_content += "<h3>Track History:</h3><table><tr><th>#</th><th>Track ID</th><th>Title</th></tr>"
@@ -539,7 +555,8 @@ async def home():
 
 @app.get("/queue", response_class=HTMLResponse)
 async def get_queue(request: Request, guild_id: str = Query(..., description="Guild ID for which to fetch the queue"),
-                    format: str = Query("html", description="Response format: html, json, xml, yaml, csv, or toml")):
+                    format: str = Query("html", description="Response format: html, json, xml, yaml, csv, or toml"),
+                    page: int = Query(1, description="Page of upcoming tracks")):
     user = request.session.get('user')
     if not user:
         return RedirectResponse(url='/login')
@@ -555,17 +572,17 @@ async def get_queue(request: Request, guild_id: str = Query(..., description="Gu
             return JSONResponse(content=error_msg, status_code=404)
     data = {
         "last_played": now_playing.get(key, None),
-        "queue": [{"track_id": item[0], "title": item[1]} for item in server_queues[key]._queue],
+        **queue_data(server_queues[key], page),
         "history": track_history.get(key, [])
     }
     if format.lower() == "html":
-        html_content = render_queue_html(guild_id, request)
+        html_content = render_queue_html(guild_id, request, page)
         return HTMLResponse(content=html_content)
     else:
         return convert_data(data, format)
 
 @app.get("/queues", response_class=HTMLResponse)
-async def get_queues(request: Request, format: str = Query("html")):
+async def get_queues(request: Request, format: str = Query("html"), page: int = Query(1)):
     user = request.session.get('user')
     if not user:
         return RedirectResponse(url='/login')
@@ -579,7 +596,7 @@ async def get_queues(request: Request, format: str = Query("html")):
     response_data = {}
     for key in target_guild_keys:
         queue = server_queues.get(key)
-        if not queue:
+        if queue is None:
             continue
         last_played = now_playing.get(key, None)
         if last_played:
@@ -597,7 +614,7 @@ async def get_queues(request: Request, format: str = Query("html")):
             track_info = {}
         response_data[str(key)] = {
             "last_played": track_info,
-            "queue": [{"track_id": item[0], "title": item[1]} for item in queue._queue],
+            **queue_data(queue, page),
             "history": track_history.get(key, [])
         }
     if format.lower() == "html":
@@ -606,6 +623,23 @@ async def get_queues(request: Request, format: str = Query("html")):
     else:
         return convert_data(response_data, format)
 
+def find_track_file(track_id):
+    if audio_index:
+        cached = audio_index.lookup(track_id)
+        return cached["path"] if cached else None
+    file_path = f"/app/music/{track_id}.mp3"
+    return file_path if os.path.exists(file_path) else None
+
+def list_library_tracks():
+    """Yields the track ids in the music library, from the audio index when the bot provided one."""
+    if audio_index:
+        for entry in audio_index.entries():
+            yield entry["track_id"]
+        return
+    for fname in os.listdir("/app/music"):
+        if fname.endswith(".mp3"):
+            yield fname[:-4]
+
 @app.get("/download/{guild_id}/{track_id}")
 async def download_track(request: Request, guild_id: str, track_id: str):
     user = request.session.get('user')
@@ -614,10 +648,10 @@ async def download_track(request: Request, guild_id: str, track_id: str):
     # Sanitize track_id
     if not track_id.replace('-', '').replace('_', '').isalnum():
         raise HTTPException(status_code=400, detail="Invalid track id")
-    file_path = f"/app/music/{track_id}.mp3"
-    if not os.path.exists(file_path):
+    file_path = find_track_file(track_id)
+    if not file_path:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, filename=f"{track_id}.mp3")
+    return FileResponse(file_path, filename=os.path.basename(file_path))
 
 @app.get("/download/owner/{track_id}")
 async def download_owner_track(request: Request, track_id: str):
@@ -627,10 +661,10 @@ async def download_owner_track(request: Request, track_id: str):
     # Sanitize track_id
     if not track_id.replace('-', '').replace('_', '').isalnum():
         raise HTTPException(status_code=400, detail="Invalid track id")
-    file_path = f"/app/music/{track_id}.mp3"
-    if not os.path.exists(file_path):
+    file_path = find_track_file(track_id)
+    if not file_path:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, filename=f"{track_id}.mp3")
+    return FileResponse(file_path, filename=os.path.basename(file_path))
 
 @app.get("/library", response_class=HTMLResponse)
 async def music_library(request: Request, q: str = "", page: int = 1, per_page: int = 20):
@@ -640,29 +674,26 @@ async def music_library(request: Request, q: str = "", page: int = 1, per_page:
     allowed_guilds = [g['id'] for g in request.session.get('guilds', [])]
     if is_owner(user['id']):
         allowed_guilds = list(server_queues.keys())
-    # Build a mapping of track_id -> allowed_guilds that have it in their queue/history
+    # Build a mapping of track_id -> allowed_guilds that have it in their history;
+    # queue membership is checked per track (GuildQueue keeps an id counter).
     track_guild_map = {}
+    allowed_queues = [(guild_id, server_queues[guild_id]) for guild_id in allowed_guilds if guild_id in server_queues]
     for guild_id in allowed_guilds:
-        if guild_id in server_queues:
-            for item in server_queues[guild_id]._queue:
-                tid = str(item[0])
-                track_guild_map.setdefault(tid, set()).add(guild_id)
         if guild_id in track_history:
             for item in track_history[guild_id]:
                 tid = str(item[0])
                 track_guild_map.setdefault(tid, set()).add(guild_id)
     music_files = []
     q_lower = q.lower()
-    for fname in os.listdir("/app/music"):
-        if fname.endswith(".mp3"):
-            track_id = fname[:-4]
-            metadata = metadata_manager.load_metadata(track_id) or {}
-            title = metadata.get("title", track_id)
-            artist = metadata.get("artist", "Unknown")
-            # Enhanced search: match query in track_id, title, or artist
-            if (not q or q_lower in track_id.lower() or q_lower in title.lower() or q_lower in artist.lower()):
-                if is_owner(user['id']) or track_id in track_guild_map:
-                    music_files.append((track_id, title, artist, sorted(track_guild_map.get(track_id, []))))
+    for track_id in list_library_tracks():
+        metadata = metadata_manager.load_metadata(track_id) or {}
+        title = metadata.get("title", track_id)
+        artist = metadata.get("artist", "Unknown")
+        # Enhanced search: match query in track_id, title, or artist
+        if (not q or q_lower in track_id.lower() or q_lower in title.lower() or q_lower in artist.lower()):
+            guilds = track_guild_map.get(track_id, set()) | {guild_id for guild_id, queue in allowed_queues if track_id in queue}
+            if is_owner(user['id']) or guilds:
+                music_files.append((track_id, title, artist, sorted(guilds, key=str)))
     # Pagination
     total = len(music_files)
     total_pages = max(1, (total + per_page - 1) // per_page)
@@ -780,10 +811,12 @@ def run_web_app():
     logging.info(f"Starting web server on 0.0.0.0:{WEB_PORT}")
     uvicorn.run(app, host="0.0.0.0", port=WEB_PORT)
 
-def start_web_server_in_background(queues, now_playing_songs, track_historys):
-    global server_queues, now_playing, track_history
+def start_web_server_in_background(queues, now_playing_songs, track_historys, audio_index_instance=None, metadata_manager_instance=None):
+    global server_queues, now_playing, track_history, audio_index, metadata_manager
     server_queues = queues
     now_playing = now_playing_songs
     track_history = track_historys
+    audio_index = audio_index_instance
+    metadata_manager = metadata_manager_instance
     thread = threading.Thread(target=run_web_app, daemon=True)
     thread.start()
\ No newline at end of file
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+import functools
+
+from utils.ytdl_pool import OPERATIONS, is_permanent_error
+
+class YtdlWorkerError(Exception):
+    """A yt-dlp call failed inside a worker process (the message names the original exception)."""
+
+class PermanentDownloadError(Exception):
+    """The track cannot be fetched no matter how often we retry (removed, private, age-gated, ...)."""
+
+class YtdlProcessPool:
+    """
+    Runs yt-dlp calls in long-lived worker processes (python -m utils.ytdl_backend).
+
+    Extraction is mostly pure Python (signature deciphering, JSON parsing) and,
+    in threads, competes for the GIL with the voice sender; in a worker it
+    cannot. Each request is one JSON line naming an OPERATIONS entry and its
+    arguments (a profile, a URL, a few params); the reply is one JSON line
+    with the summarize() record or the error (classified in the worker,
+    where the yt-dlp exception is still available). Every worker keeps its own
+    YoutubeDLPool, so it stays warm between calls. Workers start on first use; one that dies or is abandoned mid-call
+    (e.g. the caller was cancelled) is killed and replaced on the next call.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.calls = 0
+        self.restarts = 0
+        self._idle = []
+        self._started = 0
+        self._available = asyncio.Semaphore(workers)
+
+    async def _spawn(self):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "utils.ytdl_backend",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=1024 * 1024
+        )
+        self._started += 1
+        if self._started > self.workers:
+            self.restarts += 1
+        return process
+
+    async def call(self, op, args, kwargs):
+        async with self._available:
+            process = self._idle.pop() if self._idle else None
+            if process is None or process.returncode is not None:
+                process = await self._spawn()
+            request = {"op": op, "args": args, "kwargs": kwargs}
+            try:
+                process.stdin.write((json.dumps(request) + "\n").encode())
+                await process.stdin.drain()
+                line = await process.stdout.readline()
+                if not line:
+                    raise YtdlWorkerError(f"yt-dlp worker exited (code {await process.wait()})")
+                reply = json.loads(line)
+            except BaseException:
+                # The worker's reply would be read by the next call; replace it instead.
+                if process.returncode is None:
+                    process.kill()
+                raise
+            self._idle.append(process)
+            self.calls += 1
+        if not reply["ok"]:
+            if reply.get("permanent"):
+                raise PermanentDownloadError(reply["error"])
+            raise YtdlWorkerError(reply["error"])
+        return reply["record"]
+
+class YtdlBackend:
+    """
+    Where yt-dlp calls run: threads by default (the given executor, or the
+    loop's default one), or a YtdlProcessPool once configured with workers.
+    Callers only pass a profile name, a URL and per-call params, and get a
+    summarize() record back either way. Errors that retrying cannot fix are
+    raised as PermanentDownloadError.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.processes = None
+
+    def configure(self, executor=None, process_workers=0):
+        self.executor = executor
+        self.processes = YtdlProcessPool(process_workers) if process_workers > 0 else None
+
+    async def extract(self, profile, url, download=False, **params):
+        return await self._call("extract", [profile, url, download], params)
+
+    async def download_audio(self, url):
+        """See ytdl_pool.download_audio(): one extraction, one download, opus or mp3."""
+        return await self._call("download_audio", [url], {})
+
+    async def download_track(self, url, source):
+        """See ytdl_pool.download_track(): music/<source>-<id>.mp3, downloaded only if missing."""
+        return await self._call("download_track", [url, source], {})
+
+    async def _call(self, op, args, kwargs):
+        if self.processes:
+            return await self.processes.call(op, args, kwargs)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(OPERATIONS[op], *args, **kwargs))
+        except Exception as e:
+            if is_permanent_error(e):
+                raise PermanentDownloadError(str(e)) from e
+            raise
+
+ytdl_backend = YtdlBackend()
+
+def main():
+    # Replies go to the original stdout; yt-dlp's progress output and ffmpeg
+    # (which inherits fd 1) are sent to stderr so they cannot corrupt them.
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            reply = {"ok": True, "record": OPERATIONS[request["op"]](*request["args"], **request["kwargs"])}
+        except Exception as e:
+            logging.error(f"yt-dlp worker: {request['op']}{tuple(request['args'])} failed: {e}")
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}", "permanent": is_permanent_error(e)}
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+if __name__ == "__main__":
+    main()
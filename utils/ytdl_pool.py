@@ -0,0 +1,254 @@
+import os
+import re
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+from utils.download_manager import STAGING_DIR
+
+COOKIE_FILE = "config/cookies.txt"
+
+PROFILES = {
+    # First hit for a free-text query, preferring YouTube Music results.
+    "search": {
+        "default_search": "ytsearch1",
+        "quiet": True,
+        "no_warnings": True,
+        "youtube_include_dash_manifest": False,
+        "extract_flat": True,
+        "source_address": "0.0.0.0",
+        "geo_bypass": True,
+        "noplaylist": True,
+        "force_generic_extractor": True,
+        "format": "bestaudio",
+        "cookiesfrombrowser": ("chrome",),
+        "youtube_include_hls_manifest": False,
+        "force_url": "https://music.youtube.com/"
+    },
+    "search-fallback": {
+        "default_search": "ytsearch1",
+        "quiet": True,
+        "no_warnings": True,
+    },
+    # !search results.
+    "search-list": {"default_search": "ytsearch10", "quiet": True},
+    # Direct media URLs for stream mode.
+    "stream": {"format": "bestaudio/best", "quiet": True, "noplaylist": True, "cookiefile": COOKIE_FILE},
+    # Format probe for download_audio(): one extraction decides between the two download profiles.
+    "audio-probe": {"format": "bestaudio[acodec=opus]/bestaudio", "quiet": True, "cookiefile": COOKIE_FILE},
+    # YouTube downloads as <id>.opus (remuxed, not re-encoded) or <id>.mp3, written to the staging
+    # area and committed into music/ by the caller. A .part left by an interrupted run is resumed.
+    "opus-download": {
+        "format": "bestaudio[acodec=opus]/bestaudio",
+        "cookiefile": COOKIE_FILE,
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "opus"}],
+        "outtmpl": os.path.join(STAGING_DIR, "%(id)s"),
+        "continuedl": True,
+    },
+    "mp3-download": {
+        "format": "bestaudio[acodec^=opus]/bestaudio",
+        "cookiefile": COOKIE_FILE,
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "320"}],
+        "outtmpl": os.path.join(STAGING_DIR, "%(id)s"),
+        "continuedl": True,
+    },
+    # Raw stream written in place for progressive playback; the caller passes outtmpl.
+    "progressive-download": {
+        "format": "bestaudio[acodec=opus]/bestaudio",
+        "cookiefile": COOKIE_FILE,
+        "nopart": True,
+        "overwrites": True,
+    },
+    # Bandcamp albums / SoundCloud sets: the tracklist only, one request, nothing resolved per entry.
+    "tracklist": {"extract_flat": "in_playlist", "quiet": True},
+    # Bandcamp/SoundCloud tracks, transcoded to <source>-<id>.mp3 in the staging area (see download_track).
+    "mp3-url-download": {
+        "format": "bestaudio/best",
+        "continuedl": True,
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "320"}],
+    },
+}
+
+class YoutubeDLPool:
+    """
+    Pool of ready-made YoutubeDL instances, one idle list per option profile.
+
+    Building a YoutubeDL sets up every extractor, the post-processors and the
+    cookie jar; borrowing a warm one skips all of that. borrow() hands an
+    instance to one thread at a time and puts it back afterwards, so it is
+    safe to use from executor threads. If none is idle a new one is built, so
+    callers never wait on the pool; at most max_idle per profile are kept.
+
+    Per-call params (e.g. outtmpl for downloads named by the caller) are set
+    on the instance for the duration of the borrow and restored afterwards.
+    Only params that yt-dlp reads per download belong there; anything used
+    while the instance is built (postprocessors, cookies) needs its own profile.
+    """
+
+    def __init__(self, profiles, max_idle=4):
+        self.profiles = profiles
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle = {name: [] for name in profiles}
+        self._lock = threading.Lock()
+
+    def _create(self, profile):
+        ydl = yt_dlp.YoutubeDL(dict(self.profiles[profile]))
+        with self._lock:
+            self.created += 1
+        return ydl
+
+    def warm(self, profile, count=1):
+        """Builds up to count idle instances for profile ahead of the first borrow."""
+        for _ in range(count):
+            with self._lock:
+                if len(self._idle[profile]) >= min(count, self.max_idle):
+                    return
+            ydl = self._create(profile)
+            with self._lock:
+                self._idle[profile].append(ydl)
+
+    @contextmanager
+    def borrow(self, profile, **params):
+        with self._lock:
+            idle = self._idle[profile]
+            ydl = idle.pop() if idle else None
+            if ydl is not None:
+                self.reused += 1
+        if ydl is None:
+            ydl = self._create(profile)
+
+        saved = {key: ydl.params.get(key) for key in params}
+        for key, value in params.items():
+            # yt-dlp keeps output templates as {"default": ...} once an instance is built.
+            ydl.params[key] = {"default": value} if key == "outtmpl" and isinstance(value, str) else value
+        try:
+            yield ydl
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    ydl.params.pop(key, None)
+                else:
+                    ydl.params[key] = value
+            with self._lock:
+                idle = self._idle[profile]
+                if len(idle) < self.max_idle:
+                    idle.append(ydl)
+                    ydl = None
+            if ydl is not None:
+                self._close(ydl)
+
+    def stats(self):
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "idle": sum(len(idle) for idle in self._idle.values())}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {name: [] for name in self.profiles}
+        for instances in idle.values():
+            for ydl in instances:
+                self._close(ydl)
+
+    @staticmethod
+    def _close(ydl):
+        try:
+            # Saves the cookie jar like leaving "with YoutubeDL(...)" does.
+            ydl.__exit__(None, None, None)
+        except Exception as e:
+            logging.warning(f"YoutubeDLPool: error closing instance: {e}")
+
+ytdl_pool = YoutubeDLPool(PROFILES)
+atexit.register(ytdl_pool.close)
+
+RECORD_FIELDS = ("id", "title", "duration", "url", "acodec", "ext", "abr")
+
+def summarize(info):
+    """Reduces a yt-dlp info dict to the few fields the bot uses (small and JSON-safe)."""
+    if not info:
+        return None
+    record = {field: info.get(field) for field in RECORD_FIELDS}
+    if not record["url"] and info.get("requested_formats"):
+        record["url"] = info["requested_formats"][0].get("url")
+    if "entries" in info:
+        record["entries"] = [{"id": entry.get("id"), "title": entry.get("title"), "url": entry.get("url")} for entry in info["entries"] or [] if entry]
+    return record
+
+def extract_info(profile, url, download=False, **params):
+    """Runs one extract_info call on a pooled instance and returns its summarize() record. Blocking."""
+    with ytdl_pool.borrow(profile, **params) as ydl:
+        return summarize(ydl.extract_info(url, download=download))
+
+def download_audio(url):
+    """
+    Extracts url once and downloads it once. The probe picks the best audio
+    format (native Opus if there is one); that choice decides between the
+    opus-download (remux) and mp3-download (transcode) profiles, which then
+    download from the info already fetched instead of extracting again.
+    The record gets a "codec" field with the choice and the finished file in
+    the staging area as "staged". Blocking.
+    """
+    with ytdl_pool.borrow("audio-probe") as ydl:
+        info = ydl.extract_info(url, download=False)
+    codec = "opus" if (info.get("acodec") or "").startswith("opus") else "mp3"
+    with ytdl_pool.borrow(f"{codec}-download") as ydl:
+        info = ydl.process_ie_result(info, download=True)
+    record = summarize(info)
+    record["codec"] = codec
+    record["staged"] = os.path.join(STAGING_DIR, f"{info['id']}.{codec}")
+    return record
+
+def track_file_path(source, track_id):
+    """Where download_track() puts a Bandcamp/SoundCloud track."""
+    track_id = re.sub(r"[^\w-]", "_", str(track_id))
+    return os.path.join("music", f"{source}-{track_id}.mp3")
+
+def download_track(url, source):
+    """
+    Downloads a Bandcamp/SoundCloud track as music/<source>-<id>.mp3, named
+    after the extractor's track id since page slugs repeat across artists.
+    One extraction; the download is skipped when that file already exists.
+    The record gets the file as "path" and, if it was downloaded now, the
+    file in the staging area to commit there as "staged". Blocking.
+    """
+    with ytdl_pool.borrow("mp3-url-download") as ydl:
+        info = ydl.extract_info(url, download=False)
+    path = track_file_path(source, info["id"])
+    staged = None
+    if not os.path.exists(path):
+        staged = os.path.join(STAGING_DIR, os.path.basename(path))
+        with ytdl_pool.borrow("mp3-url-download", outtmpl=os.path.splitext(staged)[0]) as ydl:
+            info = ydl.process_ie_result(info, download=True)
+    record = summarize(info)
+    record["path"] = path
+    record["staged"] = staged
+    return record
+
+OPERATIONS = {"extract": extract_info, "download_audio": download_audio, "download_track": download_track}
+
+# Failures that will not go away by trying again: the reasons YouTube gives
+# (through yt-dlp's ExtractorError, expected=True) for removed, private,
+# age-gated and members-only videos. Geo blocks (GeoRestrictedError), rate
+# limiting ("... try again later") and format errors are not among them.
+PERMANENT_REASONS = (
+    "private video", "this video has been removed by the uploader",
+    "account associated with this video has been terminated", "no longer available due to a copyright claim",
+    "sign in to confirm your age", "members-only content", "available to this channel's members",
+    "incomplete youtube id",
+)
+
+def is_permanent_error(error):
+    """True if a yt-dlp exception (or the ExtractorError a DownloadError wraps) cannot be fixed by retrying."""
+    if isinstance(error, yt_dlp.utils.DownloadError) and error.exc_info:
+        error = error.exc_info[1]
+    if isinstance(error, yt_dlp.utils.GeoRestrictedError):
+        return False
+    if isinstance(error, yt_dlp.utils.UnsupportedError):
+        return True
+    if not isinstance(error, yt_dlp.utils.ExtractorError) or not error.expected:
+        return False
+    reason = error.orig_msg.lower()
+    return "try again later" not in reason and any(marker in reason for marker in PERMANENT_REASONS)